@@ -0,0 +1,276 @@
+import gzip
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from enum import Enum
+from functools import partial
+from time import monotonic, sleep
+
+from support.meter_types import OperationMode, MeterMode, MeterOperation, UltrasonicSimulationMode
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+# Recording and replay of the session, set up by the --record-trace and --replay-trace options
+TRACES = {}
+TRACED_METHOD = '<traced method>'
+TRACED_OBJECT = '<traced object>'
+# Types of responses which are written into a trace field by field and built again when it is loaded, values of other
+# types are written as their repr only
+TRACE_TYPES = {cls.__name__: cls for cls in (OperationMode, MeterMode, MeterOperation, UltrasonicSimulationMode)}
+
+
+# ***************************************************************************************
+# Command traces
+# ****************************************************************************************
+
+
+class CommandTrace(ABC):
+    # Wraps commands of the test modules (send(init, command, ...)) and other calls which talk to the meter, call() is
+    # implemented by the recording and the replay
+
+    @abstractmethod
+    def call(self, nodeid, name, function, args, kwargs):
+        pass
+
+    def wrap(self, nodeid, send):
+        def traced_send_command(init, command, *args, **kwargs):
+            return self.call(nodeid, command, partial(send, init, command), args, kwargs)
+
+        return traced_send_command
+
+    def wrap_call(self, nodeid, name, function):
+        def traced_call(*args, **kwargs):
+            return self.call(nodeid, name, function, args, kwargs)
+
+        return traced_call
+
+
+class CommandTraceRecorder(CommandTrace):
+    # Writes every command sent by the test modules, with its response and timing, as one JSON record per line:
+    # {nodeid, command, args, kwargs, start, duration, response, error}. Arguments are written as their repr, which is
+    # what the replay matches them by.
+
+    def __init__(self, path):
+        self.file = open_trace(path, 'wt')
+        self.start = monotonic()
+        self.lock = threading.Lock()
+
+    def close(self):
+        self.file.close()
+
+    def write(self, nodeid, command, args, kwargs, start, response, error):
+        _, _, args, kwargs = get_trace_key(nodeid, command, args, kwargs)
+        record = {'nodeid': nodeid, 'command': command, 'args': args, 'kwargs': kwargs, 'start': start - self.start,
+                  'duration': monotonic() - start, 'response': encode_record(response), 'error': error}
+        line = json.dumps(record)
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def call(self, nodeid, name, function, args, kwargs):
+        start = monotonic()
+        try:
+            response = function(*args, **kwargs)
+        except Exception as error:
+            self.write(nodeid, name, args, kwargs, start, None, repr(error))
+            raise
+        self.write(nodeid, name, args, kwargs, start, response, None)
+        return response
+
+
+class CommandTraceReplay(CommandTrace):
+    # Serves responses of a recorded trace instead of the meter, in recorded order for every test and command.
+    # Responses are built again from their records on every call, nothing of the trace is unpickled or evaluated.
+
+    def __init__(self, path, paced: bool = False):
+        self.paced = paced
+        self.responses = {}
+        self.lock = threading.Lock()
+        with open_trace(path, 'rt') as file:
+            for line in file:
+                record = json.loads(line)
+                key = record['nodeid'], record['command'], record['args'], record['kwargs']
+                self.responses.setdefault(key, deque()).append((record['duration'], record['response'],
+                                                                record['error']))
+
+    def close(self):
+        pass
+
+    def call(self, nodeid, name, function, args, kwargs):
+        with self.lock:
+            recorded = self.responses.get(get_trace_key(nodeid, name, args, kwargs))
+            if not recorded:
+                raise Exception(f'{name} {args} {kwargs} was not recorded for {nodeid}')
+            duration, response, error = recorded.popleft()
+        if self.paced:
+            sleep(duration)
+        if error is not None:
+            raise Exception(f'Recorded error: {error}')
+        return decode_record(response)
+
+
+class ReplayMeter:
+    # Stands in for the connection to the meter (init) while a trace is replayed, nothing is sent through it
+
+    def __repr__(self):
+        return 'ReplayMeter()'
+
+
+class TracedObject:
+    # Stands in for an object of a test module which talks to the meter (e.g. ConsumptionManager). Attribute reads,
+    # attribute writes and method calls are traced like commands under the path of the object, objects they return are
+    # traced the same way. The target is None while replaying.
+
+    def __init__(self, nodeid, path: str, target=None):
+        object.__setattr__(self, '_nodeid', nodeid)
+        object.__setattr__(self, '_path', path)
+        object.__setattr__(self, '_target', target)
+
+    def __repr__(self):
+        return f'<{self._path}>'
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        path = f'{self._path}.{name}'
+        values = []
+
+        def get_attribute():
+            values.append(getattr(self._target, name))
+            return encode_traced(values[0])
+
+        encoded = get_traced_function(self._nodeid, path, get_attribute)()
+        return decode_traced(self._nodeid, path, encoded, values[0] if values else None)
+
+    def __setattr__(self, name, value):
+        get_traced_function(self._nodeid, f'{self._path}.{name}=', partial(setattr, self._target, name))(value)
+
+
+# ***************************************************************************************
+# Functions
+# ****************************************************************************************
+
+
+def get_trace_key(nodeid, command, args, kwargs) -> tuple:
+    # Arguments are matched by their repr, the same for recorded and replayed calls
+    return nodeid, command, repr(args), repr(sorted(kwargs.items()))
+
+
+def open_trace(path, mode: str):
+    # Traces ending with .gz are compressed, others are plain text
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode[0], encoding='utf-8')
+
+
+def encode_record(value):
+    # Responses as they are written into a trace, JSON values stay as they are, everything else is tagged
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [encode_record(item) for item in value]
+    if isinstance(value, tuple) and not hasattr(value, '_fields'):
+        return {'tuple': [encode_record(item) for item in value]}
+    if isinstance(value, dict):
+        return {'dict': [[encode_record(key), encode_record(item)] for key, item in value.items()]}
+    if isinstance(value, bytes):
+        return {'bytes': value.hex()}
+    name = type(value).__name__
+    if TRACE_TYPES.get(name) is type(value):
+        if isinstance(value, Enum):
+            return {'enum': name, 'name': value.name}
+        fields = value._asdict() if hasattr(value, '_fields') else vars(value)
+        return {'object': name, 'fields': encode_record(dict(fields))}
+    return {'repr': repr(value)}
+
+
+def decode_record(encoded):
+    # Builds a response again from its record, only types of TRACE_TYPES are created
+    if not isinstance(encoded, (list, dict)):
+        return encoded
+    if isinstance(encoded, list):
+        return [decode_record(item) for item in encoded]
+    if 'tuple' in encoded:
+        return tuple(decode_record(item) for item in encoded['tuple'])
+    if 'dict' in encoded:
+        return {decode_record(key): decode_record(item) for key, item in encoded['dict']}
+    if 'bytes' in encoded:
+        return bytes.fromhex(encoded['bytes'])
+    if 'enum' in encoded:
+        return TRACE_TYPES[encoded['enum']][encoded['name']]
+    if 'object' in encoded:
+        cls = TRACE_TYPES[encoded['object']]
+        fields = decode_record(encoded['fields'])
+        if hasattr(cls, '_fields'):
+            return cls(**fields)
+        value = cls.__new__(cls)
+        vars(value).update(fields)
+        return value
+    raise Exception(f'{encoded["repr"]} was recorded as its repr only and can not be replayed, add its type to '
+                    f'TRACE_TYPES')
+
+
+def get_traced_function(nodeid, name, function):
+    # Answered from the replayed trace and/or recorded into the new one, like the commands of the test modules
+    for key in ('replay', 'record'):
+        if key in TRACES:
+            function = TRACES[key].wrap_call(nodeid, name, function)
+    return function
+
+
+def get_traced_meter_function(nodeid, name, function):
+    # function(init, ...) is traced without init, the connection differs between recording and replay
+    def traced_meter_function(init, *args, **kwargs):
+        return get_traced_function(nodeid, name, partial(function, init))(*args, **kwargs)
+
+    return traced_meter_function
+
+
+def get_traced_class(nodeid, name, cls):
+    def create_traced_object(*args, **kwargs):
+        return TracedObject(nodeid, f'{name}()', None if 'replay' in TRACES else cls(*args, **kwargs))
+
+    return create_traced_object
+
+
+def encode_traced(value):
+    # Values of traced objects as they are written into the trace, methods and objects are replaced by markers
+    if callable(value):
+        return TRACED_METHOD
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, list):
+        return [encode_traced(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(encode_traced(item) for item in value)
+    if isinstance(value, dict):
+        return {key: encode_traced(item) for key, item in value.items()}
+    return TRACED_OBJECT
+
+
+def decode_traced(nodeid, path: str, encoded, value=None):
+    # Markers of the trace become traced methods and objects again, wrapping the recorded value if there is one
+    if encoded == TRACED_METHOD:
+        def call_traced_method(*args, **kwargs):
+            values = []
+
+            def call_method(*method_args, **method_kwargs):
+                values.append(value(*method_args, **method_kwargs))
+                return encode_traced(values[0])
+
+            method_path = f'{path}()'
+            result = get_traced_function(nodeid, method_path, call_method)(*args, **kwargs)
+            return decode_traced(nodeid, f'{path}{args!r}', result, values[0] if values else None)
+
+        return call_traced_method
+    if encoded == TRACED_OBJECT:
+        return TracedObject(nodeid, path, value)
+    if isinstance(encoded, (list, tuple)):
+        items = [decode_traced(nodeid, f'{path}[{index}]', item, None if value is None else value[index])
+                 for index, item in enumerate(encoded)]
+        return items if isinstance(encoded, list) else tuple(items)
+    if isinstance(encoded, dict):
+        return {key: decode_traced(nodeid, f'{path}[{key!r}]', item, None if value is None else value[key])
+                for key, item in encoded.items()}
+    return encoded
@@ -0,0 +1,970 @@
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from copy import deepcopy
+from time import monotonic, sleep
+
+import pytest
+
+from command_trace import (TRACES, CommandTraceRecorder, CommandTraceReplay, ReplayMeter, get_traced_function,
+                           get_traced_meter_function, get_traced_class)
+from data_conversion import hex_string_to_int
+from history_log_layout import get_history_log_layout
+from meter_link import METER_LINKS, METER_LINKS_LOCK, MeterState, get_meter_link
+from support.hydrus2.commands import send_command, disable_ultrasonic_simulation
+from support.hydrus2.communication import close_irda_communication_window
+from support.meter_types import UltrasonicSimulationMode
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+# Parametrized arguments which decide in which operation mode, role and history log configuration a test starts
+STATE_PARAMETERS = ('mode', 'role', 'selector', 'selectors')
+NEXT_ITEMS = {}
+# Commands after which the meter comes back in an unknown operation mode and without an active role
+RESET_COMMANDS = ('LowLevelPowerAndReset',)
+# Readiness probing after a reset: the interval grows from the first to the last value until the meter answers
+RESET_PROBE_COMMAND = 'getErrorState'
+RESET_PROBE_INTERVALS = (0.05, 1.0)  # [s]
+RESET_READY_TIMEOUT = 10  # [s]
+# A reset is confirmed by a reset command or probe without an answer, otherwise by the flag of the exception recorder
+RESET_NO_ANSWER_ERRORS = ('timeout', 'timed out', 'no answer', 'no response')
+RESET_CONFIRM_COMMAND = 'ReadExceptionRecorder'
+RESET_CONFIRM_PARAMETER = 'resetOccured'
+IRDA_WINDOW_TIMEOUT = 30  # [s] inactivity after which the meter closes the optical communication window
+IRDA_KEEP_ALIVE_COMMAND = 'getErrorState'
+ITEP_MOCK_SERVER_TIMEOUT = 10  # [s]
+ACCU_SAMPLE_INTERVAL = 0.5  # [s]
+ACCU_SAMPLER_CAPACITY = 2048  # samples kept, older ones are overwritten
+# Fixtures which talk to the meter: they are not set up when a trace is replayed, their calls are answered from it
+REPLAY_FIXTURES = ('init', 'set_operation_mode', 'get_operation_mode', 'activate_sitp', 'ultrasonic_simulation',
+                   'open_metrological_log')
+# Functions (taking init first) and classes of the test modules which talk to the meter besides send_command
+TRACED_FUNCTIONS = ('disable_ultrasonic_simulation',)
+TRACED_CLASSES = ('ConsumptionManager',)
+COLLECT_DURATIONS = {}
+PROFILES = {}
+# Durations [s] of the tests of previous runs, kept in the pytest cache, and the duration assumed for unknown tests
+DURATIONS_CACHE_KEY = 'meter_tests/durations'
+DEFAULT_TEST_DURATION = 60
+TEST_DURATIONS = defaultdict(float)
+PASSED_TESTS = set()
+FAILED_TESTS = set()
+WALL_TIME_BAR_WIDTH = 40
+# Flow profiles as lists of (phase shift, medium temperature, duration [s]) steps, repeated until stopped
+FLOW_PROFILES = {
+    'forward': [(550, 270, 60)],
+    'backward': [(-550, 270, 60)],
+    'zero': [(0, 270, 60)],
+    'forward_backward': [(550, 270, 5), (-550, 270, 5)],
+}
+HISTORY_LOG_CAPACITY = 1096
+
+
+# ***************************************************************************************
+# IrDA session
+# ****************************************************************************************
+
+
+class IrdaSession:
+    # Keeps the optical communication window open for a batch of commands. An idle window is kept alive with a cheap
+    # command and a window closed by the meter is reopened by the next command, which pays the wake-up and handshake.
+
+    def __init__(self, init, send=send_command, window_timeout: float = IRDA_WINDOW_TIMEOUT,
+                 close_window=close_irda_communication_window):
+        self.init = init
+        self.send = send
+        self.close_window = close_window
+        self.window_timeout = window_timeout
+        self.keep_alive_period = window_timeout / 2
+        self.last_activity = None  # monotonic time of the last command, None while the window is closed
+        self.metrics = {'commands': 0, 'keep_alives': 0, 'opens': 0, 'open_time': 0.0, 'reopens': 0,
+                        'reopen_time': 0.0}
+        self.stop_event = threading.Event()
+        self.keep_alive_thread = None
+
+    def is_open(self) -> bool:
+        return self.last_activity is not None and monotonic() - self.last_activity < self.window_timeout
+
+    def is_active(self) -> bool:
+        return self.keep_alive_thread is not None
+
+    def invalidate(self):
+        self.last_activity = None
+
+    def open(self):
+        with get_meter_link(self.init).lock:
+            self.metrics['open_time'] += self.wake_up()
+            self.metrics['opens'] += 1
+        self.stop_event.clear()
+        self.keep_alive_thread = threading.Thread(target=self.keep_alive, name='irda-keep-alive', daemon=True)
+        self.keep_alive_thread.start()
+
+    def close(self):
+        self.stop_event.set()
+        if self.keep_alive_thread is not None:
+            self.keep_alive_thread.join()
+            self.keep_alive_thread = None
+        with get_meter_link(self.init).lock:
+            self.close_window(self.init)
+            self.invalidate()
+
+    def wake_up(self) -> float:
+        # Opens the window with the wake-up and handshake, returns the time [s] it took
+        start = monotonic()
+        self.send(self.init, IRDA_KEEP_ALIVE_COMMAND)
+        self.last_activity = monotonic()
+        return self.last_activity - start
+
+    def reopen(self):
+        self.metrics['reopen_time'] += self.wake_up()
+        self.metrics['reopens'] += 1
+
+    def send_command(self, init, command, *args, **kwargs):
+        if not self.is_active():
+            return self.send(init, command, *args, **kwargs)
+        with get_meter_link(init).lock:
+            if not self.is_open():
+                self.reopen()
+            try:
+                return self.send(init, command, *args, **kwargs)
+            finally:
+                self.last_activity = monotonic()
+                self.metrics['commands'] += 1
+
+    def keep_alive(self):
+        while not self.stop_event.wait(1):
+            with get_meter_link(self.init).lock:
+                # A window which already timed out is left closed, the next command reopens it
+                if not self.is_open() or monotonic() - self.last_activity < self.keep_alive_period:
+                    continue
+                try:
+                    self.send(self.init, IRDA_KEEP_ALIVE_COMMAND)
+                except Exception:
+                    self.invalidate()
+                    continue
+                self.last_activity = monotonic()
+                self.metrics['keep_alives'] += 1
+
+
+# ***************************************************************************************
+# Flow profiles
+# ****************************************************************************************
+
+
+class FlowProfileRunner:
+    # Keeps the ultrasonic simulation running and walks through the steps of a flow profile from a background thread,
+    # so tests only trigger log entries instead of enabling and disabling the simulation for each of them
+
+    def __init__(self, init, ultrasonic_simulation, disable=disable_ultrasonic_simulation):
+        self.init = init
+        self.ultrasonic_simulation = ultrasonic_simulation
+        self.disable = disable
+        self.applied_step = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def is_running(self) -> bool:
+        return self.applied_step is not None
+
+    def apply(self, phase_shift: int, medium_temperature: int):
+        with get_meter_link(self.init).lock:
+            self.ultrasonic_simulation(simulation_mode=UltrasonicSimulationMode.NORMAL,
+                                       phase_shift_diff=phase_shift * 1024, medium_temperature=medium_temperature,
+                                       resonator_calibration=False, time_difference_1us=4000,
+                                       sonic_speed_correction=19665)
+            self.applied_step = (phase_shift, medium_temperature)
+
+    def start(self, profile='forward'):
+        steps = FLOW_PROFILES[profile] if isinstance(profile, str) else list(profile)
+        self.stop_thread()
+        self.apply(*steps[0][:2])
+        if len(steps) > 1:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, args=(steps,), name='flow-profile', daemon=True)
+            self.thread.start()
+
+    def run(self, steps: list):
+        index = 0
+        while not self.stop_event.wait(steps[index][2]):
+            index = (index + 1) % len(steps)
+            if steps[index][:2] != self.applied_step:
+                self.apply(*steps[index][:2])
+
+    def stop_thread(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def stop(self):
+        self.stop_thread()
+        if self.is_running():
+            with get_meter_link(self.init).lock:
+                self.disable(self.init)
+            self.applied_step = None
+
+
+# ***************************************************************************************
+# Accumulator telemetry
+# ****************************************************************************************
+
+
+class AccuSampler:
+    # Polls the accu of every consumer of a supervisor at a fixed rate from a background thread into a preallocated
+    # ring buffer, one row per sample: time since start [s] followed by the accu values in the order of consumers()
+
+    def __init__(self, supervisor, interval: float = ACCU_SAMPLE_INTERVAL, capacity: int = ACCU_SAMPLER_CAPACITY,
+                 lock=None):
+        import numpy
+
+        self.supervisor = supervisor
+        self.consumers = supervisor.consumers()
+        self.interval = interval
+        self.lock = lock if lock is not None else nullcontext()
+        self.buffer = numpy.zeros((capacity, len(self.consumers) + 1))
+        self.count = 0
+        self.start_time = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        with self.lock:
+            values = [consumer.accu for consumer in self.consumers]
+        row = self.buffer[self.count % len(self.buffer)]
+        row[0] = monotonic() - self.start_time
+        row[1:] = values
+        self.count += 1
+
+    def run(self):
+        # Next sample time is advanced by the interval and not by the time the sample took, so the rate does not drift
+        next_time = monotonic()
+        while not self.stop_event.is_set():
+            self.sample()
+            next_time += self.interval
+            self.stop_event.wait(max(0.0, next_time - monotonic()))
+
+    def start(self):
+        self.stop()
+        self.count = 0
+        self.start_time = monotonic()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='accu-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def samples(self):
+        # Rows in the order they were sampled, oldest first
+        import numpy
+
+        capacity = len(self.buffer)
+        if self.count <= capacity:
+            return self.buffer[:self.count].copy()
+        start = self.count % capacity
+        return numpy.concatenate((self.buffer[start:], self.buffer[:start]))
+
+    def regeneration_curve(self) -> tuple:
+        # Times, accu values and accu change per second between consecutive samples, negative while regenerating
+        import numpy
+
+        samples = self.samples()
+        times, values = samples[:, 0], samples[:, 1:]
+        if len(samples) < 2:
+            return times, values, numpy.zeros((0, values.shape[1]))
+        return times, values, numpy.diff(values, axis=0) / numpy.diff(times)[:, None]
+
+    def to_csv(self) -> str:
+        header = ','.join(['time'] + [f'consumer_{index}' for index in range(len(self.consumers))])
+        rows = [','.join(f'{value:g}' for value in row) for row in self.samples()]
+        return '\n'.join([header] + rows)
+
+
+# ***************************************************************************************
+# Wall time profile
+# ****************************************************************************************
+
+
+class WallTimeProfile:
+    # Attributes the wall time of every test to the categories of the wrapped calls. Time of nested calls is counted
+    # for the innermost category only, time outside of any wrapped call is counted as 'other'. Only calls from the
+    # thread running the test are counted, background helpers overlap with it.
+
+    def __init__(self):
+        self.thread = None
+        self.stack = []
+        self.totals = defaultdict(float)
+        self.start = None
+        self.tests = {}
+
+    def start_test(self):
+        self.thread = threading.current_thread()
+        self.stack = []
+        self.totals = defaultdict(float)
+        self.start = monotonic()
+
+    def stop_test(self, nodeid):
+        duration = monotonic() - self.start
+        totals = dict(self.totals)
+        totals['other'] = max(0.0, duration - sum(totals.values()))
+        self.tests[nodeid] = totals
+        self.thread = None
+
+    def enter(self, category):
+        now = monotonic()
+        if self.stack:
+            self.totals[self.stack[-1][0]] += now - self.stack[-1][1]
+        self.stack.append([category, now])
+
+    def exit(self):
+        now = monotonic()
+        category, start = self.stack.pop()
+        self.totals[category] += now - start
+        if self.stack:
+            self.stack[-1][1] = now
+
+    def wrap(self, category, function):
+        def profiled(*args, **kwargs):
+            if threading.current_thread() is not self.thread:
+                return function(*args, **kwargs)
+            self.enter(category)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.exit()
+
+        return profiled
+
+    def modules(self) -> dict:
+        modules = {}
+        for nodeid, totals in self.tests.items():
+            module = modules.setdefault(nodeid.split('::')[0], defaultdict(float))
+            for category, duration in totals.items():
+                module[category] += duration
+        return modules
+
+
+def profile_wall_time(category, function):
+    if 'wall_time' not in PROFILES:
+        return function
+    return PROFILES['wall_time'].wrap(category, function)
+
+
+def write_wall_time(terminalreporter, name, totals):
+    # One line per category, longest first, with a bar of the share of the total time
+    total = sum(totals.values())
+    terminalreporter.write_line(f'{total:10.3f} s  {name}')
+    for category, duration in sorted(totals.items(), key=lambda item: item[1], reverse=True):
+        share = duration / total if total else 0.0
+        bar = '#' * round(share * WALL_TIME_BAR_WIDTH)
+        terminalreporter.write_line(f'{duration:10.3f} s  {share:6.1%}  {bar:<{WALL_TIME_BAR_WIDTH}}  {category}')
+
+
+# ***************************************************************************************
+# Mocked meter snapshots
+# ****************************************************************************************
+
+
+class MeterSnapshot:
+    # State of a mocked meter. Forks are new meters with their own copy of the state, so a prepared meter can be
+    # shared by test cases without one case seeing the changes of another. Calling the snapshot forks it, so it can be
+    # passed where a meter factory is expected.
+
+    def __init__(self, meter):
+        self.meter_class = type(meter)
+        self.state = deepcopy(vars(meter))
+
+    def restore(self, meter):
+        meter.__dict__.clear()
+        meter.__dict__.update(deepcopy(self.state))
+
+    def fork(self):
+        meter = self.meter_class.__new__(self.meter_class)
+        self.restore(meter)
+        return meter
+
+    def __call__(self):
+        return self.fork()
+
+
+# ***************************************************************************************
+# History log entries
+# ****************************************************************************************
+
+
+class HistoryLogEntry:
+    # Raw bytes of one history log entry, data sets are decoded only when asked for
+    __slots__ = ('raw', 'selector')
+
+    def __init__(self, raw, selector: int = None):
+        self.raw = bytes.fromhex(raw) if isinstance(raw, str) else bytes(raw)
+        self.selector = selector
+
+    def __eq__(self, other):
+        return isinstance(other, HistoryLogEntry) and self.raw == other.raw
+
+    def __repr__(self):
+        return f'HistoryLogEntry({self.hex()})'
+
+    def hex(self) -> str:
+        return self.raw.hex(' ').upper()
+
+    def field(self, name: str) -> bytes:
+        if self.selector is None:
+            raise Exception('dataSelector of the entry is unknown')
+        offset, size = get_history_log_layout(self.selector)[name]
+        return self.raw[offset:offset + size]
+
+    def value(self, name: str) -> int:
+        return int.from_bytes(self.field(name), 'little')
+
+
+class HistoryLogBuffer:
+    # Bounded container of history log entries of the same size, stored back to back in one preallocated bytearray
+
+    def __init__(self, capacity: int = HISTORY_LOG_CAPACITY, selector: int = None):
+        self.capacity = capacity
+        self.selector = selector
+        self.stride = None
+        self.data = None
+        self.length = 0
+        if selector is not None:
+            self.allocate(sum(size for _, size in get_history_log_layout(selector).values()))
+
+    def allocate(self, stride: int):
+        self.stride = stride
+        self.data = bytearray(stride * self.capacity)
+
+    def __len__(self):
+        return self.length
+
+    def __eq__(self, other):
+        return (isinstance(other, HistoryLogBuffer) and self.length == other.length
+                and self.data[:self.length * (self.stride or 0)] == other.data[:other.length * (other.stride or 0)])
+
+    def __getitem__(self, index: int) -> HistoryLogEntry:
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError(index)
+        start = index * self.stride
+        return HistoryLogEntry(self.data[start:start + self.stride], self.selector)
+
+    def __iter__(self):
+        return (self[index] for index in range(self.length))
+
+    def append(self, entry):
+        raw = entry.raw if isinstance(entry, HistoryLogEntry) else HistoryLogEntry(entry).raw
+        if self.data is None:
+            self.allocate(len(raw))
+        if len(raw) != self.stride:
+            raise Exception(f'History log entry has {len(raw)} bytes, expected {self.stride}')
+        if self.length == self.capacity:
+            raise Exception(f'History log buffer is full ({self.capacity} entries)')
+        start = self.length * self.stride
+        self.data[start:start + self.stride] = raw
+        self.length += 1
+
+    def clear(self):
+        self.length = 0
+
+
+# ***************************************************************************************
+# Internal functions
+# ****************************************************************************************
+
+
+def get_item_state(item) -> tuple:
+    callspec = getattr(item, 'callspec', None)
+    params = callspec.params if callspec is not None else {}
+    return tuple(str(params.get(name)) for name in STATE_PARAMETERS)
+
+
+def get_item_module(item) -> str:
+    return item.nodeid.split('::')[0]
+
+
+def is_no_answer_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return isinstance(error, TimeoutError) or any(marker in message for marker in RESET_NO_ANSWER_ERRORS)
+
+
+def get_cached_durations(config) -> dict:
+    cache = getattr(config, 'cache', None)
+    return cache.get(DURATIONS_CACHE_KEY, {}) if cache is not None else {}
+
+
+def assign_to_benches(items, durations: dict, benches: int) -> tuple:
+    # Longest test first to the bench which finishes earliest so far, so all benches finish at about the same time.
+    # Returns the bench index of every item and the predicted duration of every bench.
+    assignment = [0] * len(items)
+    loads = [0.0] * benches
+    order = sorted(range(len(items)), key=lambda index: durations.get(items[index].nodeid, DEFAULT_TEST_DURATION),
+                   reverse=True)
+    for index in order:
+        bench = loads.index(min(loads))
+        assignment[index] = bench
+        loads[bench] += durations.get(items[index].nodeid, DEFAULT_TEST_DURATION)
+    return assignment, loads
+
+
+# ***************************************************************************************
+# Hooks
+# ****************************************************************************************
+
+
+def pytest_addoption(parser):
+    parser.addoption('--keep-collection-order', action='store_true', default=False,
+                     help='do not group parametrized cases by operation mode, role and selector')
+    parser.addoption('--record-trace', default=None, metavar='PATH',
+                     help='record every command and response of the session into a trace file')
+    parser.addoption('--replay-trace', default=None, metavar='PATH',
+                     help='answer commands from a recorded trace file instead of the meter')
+    parser.addoption('--replay-pace', action='store_true', default=False,
+                     help='replay the trace with the recorded timing and keep the sleeps of the tests')
+    parser.addoption('--collect-profile', action='store_true', default=False,
+                     help='report how long importing and collecting every test module took '
+                          '(run python -X importtime for a breakdown per imported package)')
+    parser.addoption('--benches', type=int, default=1,
+                     help='number of meters or mocks the session is split across, tests are assigned longest first '
+                          'by their durations in previous runs')
+    parser.addoption('--bench-index', type=int, default=0,
+                     help='which of the --benches parts of the session to run, from 0')
+    parser.addoption('--wall-time-profile', action='store_true', default=False,
+                     help='report the wall time of every test and module spent in sleep, send_command, '
+                          'set_operation_mode, activate_sitp, ultrasonic_simulation and everything else')
+
+
+def pytest_configure(config):
+    if config.getoption('--replay-trace'):
+        TRACES['replay'] = CommandTraceReplay(config.getoption('--replay-trace'), config.getoption('--replay-pace'))
+    if config.getoption('--record-trace'):
+        TRACES['record'] = CommandTraceRecorder(config.getoption('--record-trace'))
+    if config.getoption('--wall-time-profile'):
+        PROFILES['wall_time'] = WallTimeProfile()
+
+
+def pytest_unconfigure(config):
+    for trace in TRACES.values():
+        trace.close()
+    TRACES.clear()
+    PROFILES.clear()
+
+
+def pytest_collection_modifyitems(config, items):
+    if not config.getoption('--keep-collection-order'):
+        order_items(items)
+    benches = config.getoption('--benches')
+    if benches > 1:
+        select_bench_items(config, items, benches, config.getoption('--bench-index'))
+
+
+def order_items(items):
+    # Rank every module and every state value in the order they first appear, so that cases are grouped by mode,
+    # then by role, then by selector without changing the order of modules
+    ranks = {}
+
+    def rank(key, value):
+        values = ranks.setdefault(key, {})
+        return values.setdefault(value, len(values))
+
+    def sort_key(indexed_item):
+        index, item = indexed_item
+        module = get_item_module(item)
+        state = get_item_state(item)
+        return ((rank('module', module),)
+                + tuple(rank((module, name), value) for name, value in zip(STATE_PARAMETERS, state))
+                + (index,))
+
+    items[:] = [item for _, item in sorted(enumerate(items), key=sort_key)]
+
+
+def select_bench_items(config, items, benches: int, bench_index: int):
+    # Keep the items assigned to this bench in their order, deselect the others
+    if not 0 <= bench_index < benches:
+        raise pytest.UsageError(f'--bench-index has to be from 0 to {benches - 1}')
+    durations = get_cached_durations(config)
+    assignment, loads = assign_to_benches(items, durations, benches)
+    selected = [item for item, bench in zip(items, assignment) if bench == bench_index]
+    deselected = [item for item, bench in zip(items, assignment) if bench != bench_index]
+    unknown = sum(item.nodeid not in durations for item in items)
+    reporter = config.pluginmanager.get_plugin('terminalreporter')
+    if reporter is not None:
+        reporter.write_line(f'predicted duration: {sum(loads):.0f} s in total, {loads[bench_index]:.0f} s on bench '
+                            f'{bench_index} of {benches} ({max(loads):.0f} s longest bench, {unknown} tests without '
+                            f'a previous duration counted as {DEFAULT_TEST_DURATION} s)')
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+    items[:] = selected
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_make_collect_report(collector):
+    start = monotonic()
+    yield
+    if isinstance(collector, pytest.Module):
+        COLLECT_DURATIONS[collector.nodeid] = monotonic() - start
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    if config.getoption('--collect-profile'):
+        terminalreporter.write_sep('-', 'test module import and collection time')
+        for nodeid, duration in sorted(COLLECT_DURATIONS.items(), key=lambda item: item[1], reverse=True):
+            terminalreporter.write_line(f'{duration:8.3f} s  {nodeid}')
+    if 'wall_time' in PROFILES:
+        profile = PROFILES['wall_time']
+        terminalreporter.write_sep('-', 'wall time per module')
+        for module, totals in sorted(profile.modules().items(), key=lambda item: sum(item[1].values()), reverse=True):
+            write_wall_time(terminalreporter, module, totals)
+        terminalreporter.write_sep('-', 'wall time per test')
+        for nodeid, totals in sorted(profile.tests.items(), key=lambda item: sum(item[1].values()), reverse=True):
+            write_wall_time(terminalreporter, nodeid, totals)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    NEXT_ITEMS[item.nodeid] = nextitem
+    if 'wall_time' not in PROFILES:
+        yield
+        return
+    PROFILES['wall_time'].start_test()
+    yield
+    PROFILES['wall_time'].stop_test(item.nodeid)
+
+
+def pytest_runtest_logreport(report):
+    TEST_DURATIONS[report.nodeid] += report.duration
+    if report.failed or report.skipped:
+        FAILED_TESTS.add(report.nodeid)
+    elif report.when == 'call':
+        PASSED_TESTS.add(report.nodeid)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    # Durations of tests which passed in this run replace the ones of previous runs. Failed, skipped and interrupted
+    # tests stopped early, so the durations of previous runs are kept for them. A replayed run does not wait for the
+    # meter and is not stored at all.
+    cache = getattr(session.config, 'cache', None)
+    if cache is None or session.config.getoption('--replay-trace'):
+        return
+    passed = PASSED_TESTS - FAILED_TESTS
+    if not passed:
+        return
+    durations = get_cached_durations(session.config)
+    durations.update({nodeid: TEST_DURATIONS[nodeid] for nodeid in passed})
+    cache.set(DURATIONS_CACHE_KEY, durations)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_fixture_setup(fixturedef, request):
+    # While replaying, the fixtures which talk to the meter are not set up, the connection is a stand-in and their calls
+    # are answered from the trace. Overrides of these fixtures in this file are set up as usual.
+    if ('replay' not in TRACES or fixturedef.argname not in REPLAY_FIXTURES
+            or getattr(fixturedef.func, '__globals__', None) is globals()):
+        return None
+    if fixturedef.argname == 'init':
+        result = ReplayMeter()
+    else:
+        result = TRACES['replay'].wrap_call(request.node.nodeid, fixturedef.argname, None)
+    fixturedef.cached_result = (result, fixturedef.cache_key(request), None)
+    return result
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    outcome = yield
+    # After a failure the meter can be left anywhere, so the next transition has to be sent for real
+    if outcome.get_result().failed:
+        with METER_LINKS_LOCK:
+            links = list(METER_LINKS.values())
+        for link in links:
+            link.state.invalidate()
+
+
+# ***************************************************************************************
+# Fixtures
+# ****************************************************************************************
+
+
+@pytest.fixture
+def restore_state(request) -> bool:
+    # The post-condition switch back to production mode is needed only when the next test starts from
+    # a different mode, role or selector
+    next_item = NEXT_ITEMS.get(request.node.nodeid)
+    if next_item is None:
+        return True
+    return get_item_state(next_item) != get_item_state(request.node)
+
+
+@pytest.fixture
+def link_lock(init) -> threading.RLock:
+    # Taken by helpers that talk to the meter from other threads, so their commands do not interleave with the test's
+    return get_meter_link(init).lock
+
+
+@pytest.fixture
+def meter_state(init) -> MeterState:
+    return get_meter_link(init).state
+
+
+@pytest.fixture
+def set_operation_mode(request, set_operation_mode, meter_state):
+    set_operation_mode = get_traced_function(request.node.nodeid, 'set_operation_mode', set_operation_mode)
+
+    def cached_set_operation_mode(operation_mode):
+        if meter_state.is_operation_mode(operation_mode):
+            return
+        # Switching the mode closes the SITP session, state stays unknown if the switch fails
+        meter_state.invalidate()
+        set_operation_mode(operation_mode)
+        meter_state.operation_mode = operation_mode
+
+    return profile_wall_time('set_operation_mode', cached_set_operation_mode)
+
+
+@pytest.fixture
+def get_operation_mode(request, get_operation_mode, meter_state):
+    get_operation_mode = get_traced_function(request.node.nodeid, 'get_operation_mode', get_operation_mode)
+
+    def tracked_get_operation_mode():
+        try:
+            operation_mode = get_operation_mode()
+        except Exception:
+            meter_state.invalidate()
+            raise
+        if not meter_state.is_operation_mode(operation_mode):
+            meter_state.invalidate()
+            meter_state.operation_mode = operation_mode
+        return operation_mode
+
+    return tracked_get_operation_mode
+
+
+@pytest.fixture
+def activate_sitp(request, activate_sitp, meter_state):
+    activate_sitp = get_traced_function(request.node.nodeid, 'activate_sitp', activate_sitp)
+
+    def cached_activate_sitp(role):
+        if meter_state.is_role(role):
+            return
+        meter_state.role = None
+        activate_sitp(role)
+        meter_state.role = role
+
+    return profile_wall_time('activate_sitp', cached_activate_sitp)
+
+
+@pytest.fixture
+def ultrasonic_simulation(request, ultrasonic_simulation):
+    ultrasonic_simulation = get_traced_function(request.node.nodeid, 'ultrasonic_simulation', ultrasonic_simulation)
+    return profile_wall_time('ultrasonic_simulation', ultrasonic_simulation)
+
+
+@pytest.fixture
+def open_metrological_log(request, open_metrological_log):
+    return get_traced_function(request.node.nodeid, 'open_metrological_log', open_metrological_log)
+
+
+@pytest.fixture(autouse=True)
+def route_send_command(request, monkeypatch):
+    # Chain the wrappers of the test module's send_command: trace replay or recording closest to the meter, then
+    # forgetting the cached mode and role whenever a test resets the meter and serializing with background helpers on
+    # the same connection. Other functions and classes of the module which talk to the meter are traced as well.
+    nodeid = request.node.nodeid
+    for name in TRACED_FUNCTIONS:
+        if TRACES and hasattr(request.module, name):
+            monkeypatch.setattr(request.module, name,
+                                get_traced_meter_function(nodeid, name, getattr(request.module, name)))
+    for name in TRACED_CLASSES:
+        if TRACES and hasattr(request.module, name):
+            monkeypatch.setattr(request.module, name, get_traced_class(nodeid, name, getattr(request.module, name)))
+    module_send_command = getattr(request.module, 'send_command', None)
+    if module_send_command is None:
+        yield
+        return
+    for key in ('replay', 'record'):
+        if key in TRACES:
+            module_send_command = TRACES[key].wrap(nodeid, module_send_command)
+    if 'replay' in TRACES and not TRACES['replay'].paced and hasattr(request.module, 'sleep'):
+        monkeypatch.setattr(request.module, 'sleep', lambda seconds: None)
+    if 'wall_time' in PROFILES and hasattr(request.module, 'sleep'):
+        monkeypatch.setattr(request.module, 'sleep', profile_wall_time('sleep', request.module.sleep))
+
+    def tracked_send_command(init, command, *args, **kwargs):
+        link = get_meter_link(init)
+        if command.strip() in RESET_COMMANDS:
+            link.state.invalidate()
+        return link.send(module_send_command, init, command, *args, **kwargs)
+
+    monkeypatch.setattr(request.module, 'send_command', profile_wall_time('send_command', tracked_send_command))
+    with METER_LINKS_LOCK:
+        metrics_before = {link: dict(link.metrics) for link in METER_LINKS.values()}
+    yield
+    # Traffic of this test on every connection it used
+    with METER_LINKS_LOCK:
+        links = list(METER_LINKS.values())
+    for link in links:
+        before = metrics_before.get(link, dict.fromkeys(link.metrics, 0))
+        if link.metrics['commands'] != before['commands']:
+            request.node.user_properties.append(
+                ('meter_link', {'connection': link.name,
+                                **{name: value - before[name] for name, value in link.metrics.items()}}))
+
+
+@pytest.fixture
+def reset_and_wait_ready(request):
+    # Reset the meter and probe it with a cheap command at growing intervals, returning the time [s] it took to answer.
+    # Cached mode and role and the IrDA window of the test are forgotten, the reset closes them on the meter. A meter
+    # which answered everything is asked if the reset occurred.
+    def reset_and_wait(init, reset_type: str = '06', timeout: float = RESET_READY_TIMEOUT) -> float:
+        send = getattr(request.module, 'send_command', send_command)
+        start = monotonic()
+        reset_confirmed = False
+        try:
+            send(init, 'LowLevelPowerAndReset', parameters=reset_type)
+        except Exception as error:
+            # The meter may reset before the answer is sent, any other error means the reset was not done
+            if not is_no_answer_error(error):
+                raise
+            reset_confirmed = True
+        get_meter_link(init).state.invalidate()
+        if 'irda_session' in request.fixturenames:
+            request.getfixturevalue('irda_session').invalidate()
+        interval, max_interval = RESET_PROBE_INTERVALS
+        while True:
+            try:
+                send(init, RESET_PROBE_COMMAND)
+                break
+            except Exception as error:
+                # Only a meter which does not answer is still resetting, any other error is a fault of the probe
+                if not is_no_answer_error(error):
+                    raise
+                reset_confirmed = True
+                if monotonic() - start > timeout:
+                    raise Exception(f'Meter is not ready within {timeout} s after reset {reset_type}')
+            sleep(interval)
+            interval = min(interval * 2, max_interval)
+        ready_time = monotonic() - start
+        if not reset_confirmed:
+            response = send(init, RESET_CONFIRM_COMMAND, return_parameters=[RESET_CONFIRM_PARAMETER])
+            if not hex_string_to_int(response[RESET_CONFIRM_PARAMETER]):
+                raise Exception(f'Meter answered all commands but did not reset after reset {reset_type}')
+        return ready_time
+
+    return reset_and_wait
+
+
+@pytest.fixture
+def irda_session(request, monkeypatch, init) -> IrdaSession:
+    # Commands of the test module go through the session, which keeps the window alive between open() and close()
+    session = IrdaSession(init, send=getattr(request.module, 'send_command', send_command),
+                          close_window=get_traced_meter_function(request.node.nodeid, 'close_irda_communication_window',
+                                                                 close_irda_communication_window))
+    if hasattr(request.module, 'send_command'):
+        monkeypatch.setattr(request.module, 'send_command', session.send_command)
+    yield session
+    if session.is_active():
+        session.close()
+    request.node.user_properties.append(('irda_session', dict(session.metrics)))
+
+
+@pytest.fixture
+def itep_mock_server():
+    # Serves mocked meters on an event loop in a background thread, the test talks to them with ItepMockClient
+    from itep_mock_server import ItepMockServer
+
+    servers = []
+
+    def start_itep_mock_server(meters: list, path: str = None):
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name='itep-mock-server', daemon=True)
+        thread.start()
+        server = ItepMockServer(meters)
+        servers.append((server, loop, thread))
+        asyncio.run_coroutine_threadsafe(server.start(path=path), loop).result(ITEP_MOCK_SERVER_TIMEOUT)
+        return server
+
+    yield start_itep_mock_server
+    for server, loop, thread in servers:
+        if server.server is not None:
+            asyncio.run_coroutine_threadsafe(server.stop(), loop).result(ITEP_MOCK_SERVER_TIMEOUT)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(ITEP_MOCK_SERVER_TIMEOUT)
+        loop.close()
+
+
+@pytest.fixture
+def flow_profile(request, init, ultrasonic_simulation) -> FlowProfileRunner:
+    runner = FlowProfileRunner(init, ultrasonic_simulation,
+                               disable=get_traced_meter_function(request.node.nodeid, 'disable_ultrasonic_simulation',
+                                                                 disable_ultrasonic_simulation))
+    yield runner
+    runner.stop()
+
+
+@pytest.fixture(scope='session')
+def meter_snapshots() -> dict:
+    return {}
+
+
+@pytest.fixture
+def meter_snapshot(meter_snapshots):
+    # The mocked meter is created and prepared by create() once per session under the given name, every case gets the
+    # same snapshot to fork its meters from
+    def get_meter_snapshot(name: str, create) -> MeterSnapshot:
+        if name not in meter_snapshots:
+            meter_snapshots[name] = MeterSnapshot(create())
+        return meter_snapshots[name]
+
+    return get_meter_snapshot
+
+
+@pytest.fixture
+def accu_sampler(link_lock):
+    # Samplers of the test are stopped at teardown, also when the test fails before stopping them
+    samplers = []
+
+    def create_accu_sampler(supervisor, interval: float = ACCU_SAMPLE_INTERVAL,
+                            capacity: int = ACCU_SAMPLER_CAPACITY) -> AccuSampler:
+        sampler = AccuSampler(supervisor, interval, capacity, lock=link_lock)
+        samplers.append(sampler)
+        return sampler
+
+    yield create_accu_sampler
+    for sampler in samplers:
+        sampler.stop()
+
+
+@pytest.fixture
+def history_log_buffer():
+    # New buffers for every test, so no entries are shared between parametrized cases
+    def create_history_log_buffer(capacity: int = HISTORY_LOG_CAPACITY, selector: int = None) -> HistoryLogBuffer:
+        return HistoryLogBuffer(capacity, selector)
+
+    return create_history_log_buffer
+
+
+@pytest.fixture
+def read_in_sequence(request):
+    # Send related reads one after another while holding the link of init, so no other traffic on that connection comes
+    # in between, and return one dict of the responses keyed by (command, parameters). This is not a pipelined batch,
+    # every read is still its own round trip.
+    def read_responses_in_sequence(init, requests: list) -> dict:
+        send = getattr(request.module, 'send_command', send_command)
+        responses = {}
+        with get_meter_link(init).lock:
+            for command, parameters, return_parameters in requests:
+                if parameters is None:
+                    responses[(command, parameters)] = send(init, command, return_parameters=return_parameters)
+                else:
+                    responses[(command, parameters)] = send(init, command, parameters,
+                                                            return_parameters=return_parameters)
+        return responses
+
+    return read_responses_in_sequence
+
@@ -0,0 +1,18 @@
+# ***************************************************************************************
+# Functions
+# ****************************************************************************************
+
+
+def int_to_hex_string(integer: int, num_bytes: int) -> str:
+    return integer.to_bytes(num_bytes, 'little').hex().upper()
+
+
+def hex_string_to_int(lsb_hex_string):
+    int_value = int("".join(lsb_hex_string.split()[::-1]), 16)
+    return int_value
+
+
+def get_percentile(sorted_values: list, percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
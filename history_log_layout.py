@@ -0,0 +1,64 @@
+from enum import Enum
+from functools import lru_cache
+
+# ***************************************************************************************
+# History log data sets
+# ****************************************************************************************
+# Data sets in the order they are stored in an entry with their size in bytes and dataSelector bit
+HistoryLogDataSetSizes = {
+    'dateTimeTypeG': 2,
+    'dateTimeTypeF': 4,
+    'sumVolume': 4,
+    'forwardVolume': 4,
+    'backwardVolume': 4,
+    'currentFlow': 3,
+    'maximumFlow': 3,
+    'minimumFlow': 3,
+    'mediumTemp': 2,
+    'ambientTemp': 2,
+    'operatingHours': 3,
+    'errorHours': 2,
+    'errorState': 4,
+}
+
+
+class HistoryLogDataSetBitPlaces(Enum):
+    DATETIME_TYPE_G = 0x0100
+    DATETIME_TYPE_F = 0x0200
+    VOLUME_SUM = 0x0400
+    VOLUME_FORWARD = 0x0800
+    VOLUME_BACKWARD = 0x1000
+    FLOW_CURRENT = 0x2000
+    FLOW_MAXIMUM = 0x4000
+    FLOW_MINIMUM = 0x8000
+    TEMP_MEDIUM = 0x0001
+    TEMP_AMBIENT = 0x0002
+    OPERATING_HOURS = 0x0004
+    ERROR_HOURS = 0x0008
+    ERROR_STATE = 0x0010
+
+
+# Size in bytes of every data set bit in a history log entry, in the order the data sets are stored
+HISTORY_LOG_DATA_SET_BIT_SIZES = dict(zip([bit_place.value for bit_place in HistoryLogDataSetBitPlaces],
+                                          HistoryLogDataSetSizes.values()))
+
+
+# ***************************************************************************************
+# Functions
+# ****************************************************************************************
+
+
+@lru_cache(maxsize=None)
+def get_history_log_layout(selector: int) -> dict:
+    # offset and size of every data set stored in an entry configured with the dataSelector
+    layout = {}
+    offset = 0
+    for (name, size), bit in zip(HistoryLogDataSetSizes.items(), HISTORY_LOG_DATA_SET_BIT_SIZES):
+        if selector & bit:
+            layout[name] = (offset, size)
+            offset += size
+    return layout
+
+
+def get_selector_data_size(selector: int) -> int:
+    return sum(size for _, size in get_history_log_layout(selector).values())
@@ -0,0 +1,217 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+from typing import NamedTuple
+
+from data_conversion import int_to_hex_string, hex_string_to_int, get_percentile
+from support.hydrus2.commands import send_command
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+
+FLEET_LOG_CAPACITY = 1096  # entries of the history log of every meter
+FLEET_READOUT_WORKERS = 8
+FLEET_LATENCY_PERCENTILES = (50, 90, 99)
+
+
+# ***************************************************************************************
+# Fleet
+# ****************************************************************************************
+
+
+def get_response_value(integer: int, num_bytes: int) -> str:
+    # LSB first hex bytes separated by spaces, as the mocked meter answers
+    return integer.to_bytes(num_bytes, 'little').hex(' ').upper()
+
+
+class FleetHistoryLog:
+    # History logs of all meters of a fleet in one preallocated bytearray: capacity entries of stride bytes per meter,
+    # back to back in the order of the meters. Every meter has its own number of entries and write pointer, so its log
+    # is a ring buffer like the one of the meter.
+
+    def __init__(self, meters: int, stride: int, capacity: int = FLEET_LOG_CAPACITY):
+        self.meters = meters
+        self.stride = stride
+        self.capacity = capacity
+        self.data = bytearray(meters * capacity * stride)
+        self.lengths = array('H', [0] * meters)
+        self.write_pointers = array('H', [0] * meters)
+
+    @classmethod
+    def from_meter(cls, meter, meters: int, capacity: int = FLEET_LOG_CAPACITY):
+        # Every meter of the fleet starts with the history log of the prepared mocked meter, which is read once
+        info = send_command(meter, 'getHistoryLogInfo', return_parameters=['nrOfEntries', 'dataSize'])
+        log = cls(meters, hex_string_to_int(info['dataSize']), capacity)
+        entries = [bytes.fromhex(send_command(meter, 'readHistoryLog', parameters=int_to_hex_string(index, 2) + '01',
+                                              return_parameters=['dataSet'])['dataSet'])
+                   for index in range(hex_string_to_int(info['nrOfEntries']))]
+        for meter_index in range(meters):
+            for entry in entries:
+                log.append(meter_index, entry)
+        return log
+
+    def append(self, meter: int, raw: bytes):
+        if len(raw) != self.stride:
+            raise Exception(f'Entry of {len(raw)} bytes does not fit entries of {self.stride} bytes')
+        offset = (meter * self.capacity + self.write_pointers[meter]) * self.stride
+        self.data[offset:offset + self.stride] = raw
+        self.write_pointers[meter] = (self.write_pointers[meter] + 1) % self.capacity
+        self.lengths[meter] = min(self.lengths[meter] + 1, self.capacity)
+
+    def entry(self, meter: int, index: int) -> memoryview:
+        # index 0 is the oldest entry of the meter
+        if not 0 <= index < self.lengths[meter]:
+            raise Exception(f'Entry index {index} is out of the {self.lengths[meter]} entries of meter {meter}')
+        oldest = self.write_pointers[meter] if self.lengths[meter] == self.capacity else 0
+        offset = (meter * self.capacity + (oldest + index) % self.capacity) * self.stride
+        return memoryview(self.data)[offset:offset + self.stride]
+
+
+class FleetMeter:
+    # Mocked meter of a fleet: a view of its history log in the shared FleetHistoryLog that answers the history log
+    # readout commands, without a mocked meter of its own
+
+    def __init__(self, log: FleetHistoryLog, index: int):
+        self.log = log
+        self.index = index
+
+    def send_command(self, command: str, parameters: str = None, return_parameters: list = None) -> dict:
+        command = command.strip()
+        if command == 'getHistoryLogInfo':
+            response = {'nrOfEntries': get_response_value(self.log.lengths[self.index], 2),
+                        'nrOfPossibleEntries': get_response_value(self.log.capacity, 2),
+                        'dataSize': get_response_value(self.log.stride, 2)}
+        elif command == 'readHistoryLog':
+            raw = bytes.fromhex(parameters)
+            first, count = int.from_bytes(raw[:2], 'little'), raw[2]
+            response = {'dataSet': b''.join(self.log.entry(self.index, index)
+                                            for index in range(first, first + count)).hex(' ').upper()}
+        else:
+            raise Exception(f'{command} is not supported by meters of a fleet')
+        if return_parameters is None:
+            return response
+        return {name: response[name] for name in return_parameters}
+
+
+class MeterFleet:
+    # Meters of a fleet addressed by index, all of them views of one FleetHistoryLog
+
+    def __init__(self, log: FleetHistoryLog):
+        self.log = log
+        self.meters = [FleetMeter(log, index) for index in range(log.meters)]
+
+    def __len__(self):
+        return len(self.meters)
+
+    def __getitem__(self, index: int) -> FleetMeter:
+        return self.meters[index]
+
+
+def send_fleet_command(init, command: str, parameters: str = None, return_parameters: list = None):
+    # send_command(init, ...) for meters of a fleet, other meters are passed to send_command
+    if isinstance(init, FleetMeter):
+        return init.send_command(command, parameters, return_parameters)
+    if parameters is None:
+        return send_command(init, command, return_parameters=return_parameters)
+    return send_command(init, command, parameters, return_parameters=return_parameters)
+
+
+class FleetLogStorage:
+    # History log entries read from all meters of a fleet, stored in one preallocated bytearray: capacity entries of
+    # stride bytes per meter, back to back in the order of the meters
+
+    def __init__(self, meters: int, stride: int, capacity: int = FLEET_LOG_CAPACITY):
+        self.meters = meters
+        self.stride = stride
+        self.capacity = capacity
+        self.data = bytearray(meters * capacity * stride)
+        self.lengths = array('H', [0] * meters)
+
+    def store(self, meter: int, index: int, raw: bytes):
+        if len(raw) != self.stride:
+            raise Exception(f'Entry of {len(raw)} bytes does not fit entries of {self.stride} bytes')
+        if not 0 <= index < self.capacity:
+            raise Exception(f'Entry index {index} is out of the capacity {self.capacity}')
+        offset = (meter * self.capacity + index) * self.stride
+        self.data[offset:offset + self.stride] = raw
+        self.lengths[meter] = max(self.lengths[meter], index + 1)
+
+    def entry(self, meter: int, index: int) -> bytes:
+        offset = (meter * self.capacity + index) * self.stride
+        return bytes(self.data[offset:offset + self.stride])
+
+    def entries(self, meter: int) -> memoryview:
+        # entries of one meter without copying them, stride bytes each
+        offset = meter * self.capacity * self.stride
+        return memoryview(self.data)[offset:offset + self.lengths[meter] * self.stride]
+
+
+# ***************************************************************************************
+# Readout
+# ****************************************************************************************
+
+
+class FleetReadoutReport(NamedTuple):
+    meters: int
+    workers: int
+    entries: int
+    requests: int
+    duration: float  # [s]
+    meters_rate: float  # [meters/s]
+    entries_rate: float  # [entries/s]
+    meter_latencies: dict  # percentile: readout time of one meter [s]
+    failed_meters: list  # (meter, error)
+
+
+class FleetReadoutDriver:
+    # Reads the complete history log of every meter of a fleet with a pool of workers, one meter per worker at a time.
+    # request_interval spaces the requests to one meter, so the readout stays within the consumption budget of the
+    # meter's communication consumer.
+
+    def __init__(self, fleet: MeterFleet, storage: FleetLogStorage, workers: int = FLEET_READOUT_WORKERS,
+                 request_interval: float = 0.0):
+        self.fleet = fleet
+        self.storage = storage
+        self.workers = workers
+        self.request_interval = request_interval
+
+    def read_meter(self, meter_index: int) -> tuple:
+        meter = self.fleet[meter_index]
+        start = monotonic()
+        next_request = start
+        requests = 0
+        nr_of_entries = hex_string_to_int(send_fleet_command(meter, 'getHistoryLogInfo',
+                                                             return_parameters=['nrOfEntries'])['nrOfEntries'])
+        requests += 1
+        for index in range(min(nr_of_entries, self.storage.capacity)):
+            if self.request_interval:
+                next_request += self.request_interval
+                delay = next_request - monotonic()
+                if delay > 0:
+                    sleep(delay)
+            data_set = send_fleet_command(meter, 'readHistoryLog', parameters=int_to_hex_string(index, 2) + '01',
+                                          return_parameters=['dataSet'])['dataSet']
+            self.storage.store(meter_index, index, bytes.fromhex(data_set))
+            requests += 1
+        return meter_index, requests, monotonic() - start
+
+    def try_read_meter(self, meter_index: int) -> tuple:
+        try:
+            return self.read_meter(meter_index) + (None,)
+        except Exception as error:
+            return meter_index, 0, 0.0, f'{type(error).__name__}: {error}'
+
+    def run(self) -> FleetReadoutReport:
+        start = monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(self.try_read_meter, range(len(self.fleet))))
+        duration = monotonic() - start
+        latencies = sorted(latency for _, _, latency, error in results if error is None)
+        percentiles = {percentile: get_percentile(latencies, percentile) for percentile in FLEET_LATENCY_PERCENTILES}
+        percentiles['max'] = latencies[-1] if latencies else 0.0
+        entries = sum(self.storage.lengths)
+        return FleetReadoutReport(len(self.fleet), self.workers, entries, sum(result[1] for result in results),
+                                  duration, len(self.fleet) / duration if duration else 0.0,
+                                  entries / duration if duration else 0.0, percentiles,
+                                  [(meter, error) for meter, _, _, error in results if error is not None])
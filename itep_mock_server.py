@@ -0,0 +1,186 @@
+"""JSON RPC shim serving mocked meters over TCP or a Unix socket.
+
+This is not a transport-level mock: it does not speak the meter's L-Bus or IrDA framing and has no pty or serial
+endpoint. Every request is one JSON object per line naming the command, and the server passes it to send_command of an
+in-process mocked meter. It exercises concurrency of connections and of meters, not the wire protocol of the meter.
+"""
+import argparse
+import asyncio
+import json
+import socket
+from itertools import count
+
+from support.hydrus2.commands import send_command
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+
+# Every request and response is one JSON object per line:
+# request:  {"id": 1, "meter": 0, "command": "getErrorState", "parameters": null, "return_parameters": ["pendingErrors"]}
+# response: {"id": 1, "response": {...}} or {"id": 1, "error": "..."}
+ENCODING = 'utf-8'
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_METERS = 1
+STREAM_LIMIT = 2 ** 20  # [bytes] longest request line
+
+
+# ***************************************************************************************
+# Server
+# ****************************************************************************************
+
+
+class ItepMockServer:
+    # Serves mocked meters to many connections on one event loop. Commands are executed in the default executor of the
+    # loop, so the loop keeps serving other connections meanwhile. Commands of one meter are executed one after another,
+    # commands of different meters run at the same time.
+
+    def __init__(self, meters: list):
+        self.meters = meters
+        self.meter_locks = [asyncio.Lock() for _ in meters]
+        self.server = None
+        self.address = None
+        self.metrics = {'connections': 0, 'requests': 0, 'errors': 0}
+
+    def execute(self, request: dict):
+        meter = self.meters[request.get('meter', 0)]
+        parameters = request.get('parameters')
+        return_parameters = request.get('return_parameters')
+        if parameters is None:
+            return send_command(meter, request['command'], return_parameters=return_parameters)
+        return send_command(meter, request['command'], parameters, return_parameters=return_parameters)
+
+    async def handle_request(self, line: bytes) -> dict:
+        self.metrics['requests'] += 1
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            self.metrics['errors'] += 1
+            return {'id': None, 'error': f'Invalid request: {error}'}
+        if not isinstance(request, dict):
+            self.metrics['errors'] += 1
+            return {'id': None, 'error': f'Invalid request: expected a JSON object, got {type(request).__name__}'}
+        try:
+            async with self.meter_locks[request.get('meter', 0)]:
+                response = await asyncio.get_running_loop().run_in_executor(None, self.execute, request)
+            return {'id': request.get('id'), 'response': response}
+        except Exception as error:
+            self.metrics['errors'] += 1
+            return {'id': request.get('id'), 'error': f'{type(error).__name__}: {error}'}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.metrics['connections'] += 1
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response).encode(ENCODING) + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = 0, path: str = None):
+        # Listen on a Unix socket if a path is given, otherwise on TCP. Port 0 picks a free port.
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, path=path, limit=STREAM_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port, limit=STREAM_LIMIT)
+        self.address = self.server.sockets[0].getsockname()
+        return self.address
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+# ***************************************************************************************
+# Client
+# ****************************************************************************************
+
+
+class ItepMockClient:
+    # Blocking client for one connection, usable from test processes or threads that share the served meters
+
+    def __init__(self, address, meter: int = 0, timeout: float = 10):
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.stream = self.socket.makefile('rwb')
+        self.meter = meter
+        self.ids = count(1)
+
+    def send_command(self, command: str, parameters: str = None, return_parameters: list = None, meter: int = None):
+        request = {'id': next(self.ids), 'meter': self.meter if meter is None else meter, 'command': command,
+                   'parameters': parameters, 'return_parameters': return_parameters}
+        self.stream.write(json.dumps(request).encode(ENCODING) + b'\n')
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise Exception('Connection to the mocked meter server closed')
+        response = json.loads(line)
+        if 'error' in response:
+            raise Exception(response['error'])
+        return response['response']
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def send_client_command(init, command: str, parameters: str = None, return_parameters: list = None):
+    # send_command(init, ...) for tests whose init is a client of the server, other meters are passed to send_command.
+    # Test modules import it as send_command, so the conftest wrappers (links, traces, profiles) apply to it as well.
+    if isinstance(init, ItepMockClient):
+        return init.send_command(command, parameters, return_parameters)
+    if parameters is None:
+        return send_command(init, command, return_parameters=return_parameters)
+    return send_command(init, command, parameters, return_parameters=return_parameters)
+
+
+# ***************************************************************************************
+# Main
+# ****************************************************************************************
+
+
+async def serve(meters: list, host: str, port: int, path: str):
+    server = ItepMockServer(meters)
+    address = await server.start(host, port, path)
+    print(f'Serving {len(meters)} mocked meter(s) on {address}', flush=True)
+    await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve mocked meters over a JSON RPC shim, one JSON request per line')
+    parser.add_argument('--meters', type=int, default=DEFAULT_METERS, help='number of mocked meters')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=0, help='TCP port, 0 picks a free one')
+    parser.add_argument('--unix', default=None, help='path of a Unix socket to listen on instead of TCP')
+    arguments = parser.parse_args()
+
+    from meter_interaction.itep_mock import ItepMock
+
+    try:
+        asyncio.run(serve([ItepMock() for _ in range(arguments.meters)], arguments.host, arguments.port,
+                          arguments.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
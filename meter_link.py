@@ -0,0 +1,74 @@
+import threading
+import weakref
+from time import monotonic
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+# Link of every connection to the meter (init), dropped together with the connection
+METER_LINKS = weakref.WeakKeyDictionary()
+METER_LINKS_LOCK = threading.Lock()
+
+
+# ***************************************************************************************
+# Meter state tracking
+# ****************************************************************************************
+
+
+class MeterState:
+    # Operation mode and SITP role the meter is known to be in, None when unknown
+
+    def __init__(self):
+        self.operation_mode = None
+        self.role = None
+
+    def invalidate(self):
+        self.operation_mode = None
+        self.role = None
+
+    def is_operation_mode(self, operation_mode) -> bool:
+        return (self.operation_mode is not None
+                and self.operation_mode.mode == operation_mode.mode
+                and self.operation_mode.operation == operation_mode.operation)
+
+    def is_role(self, role) -> bool:
+        return self.role is not None and self.role == role
+
+
+# ***************************************************************************************
+# Meter links
+# ****************************************************************************************
+
+
+class MeterLink:
+    # One connection (init). The lock serializes the test and background helpers on this connection only, traffic of
+    # other connections is not held up by it. The state known for the meter belongs to the connection, so a new
+    # connection starts with an unknown mode and role.
+
+    def __init__(self, init):
+        self.name = type(init).__name__
+        self.lock = threading.RLock()
+        self.state = MeterState()
+        self.metrics = {'commands': 0, 'errors': 0, 'busy_time': 0.0, 'wait_time': 0.0}
+
+    def send(self, send, init, command, *args, **kwargs):
+        requested = monotonic()
+        with self.lock:
+            started = monotonic()
+            self.metrics['wait_time'] += started - requested
+            try:
+                return send(init, command, *args, **kwargs)
+            except Exception:
+                self.metrics['errors'] += 1
+                raise
+            finally:
+                self.metrics['commands'] += 1
+                self.metrics['busy_time'] += monotonic() - started
+
+
+def get_meter_link(init) -> MeterLink:
+    with METER_LINKS_LOCK:
+        link = METER_LINKS.get(init)
+        if link is None:
+            link = METER_LINKS[init] = MeterLink(init)
+        return link
@@ -0,0 +1,135 @@
+import json
+
+import allure
+import pytest
+
+from command_trace import CommandTraceRecorder, CommandTraceReplay, ReplayMeter, TracedObject, TRACES
+from data_conversion import int_to_hex_string
+from support.hydrus2.commands import send_command
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+
+TRACE_NODEID = 'test_command_trace.py::recorded_test'
+TRACE_DATA_SELECTOR = 0x0C00  # sumVolume and forwardVolume
+TRACE_LOG_ENTRIES = 3
+
+
+# ***************************************************************************************
+# Local Functions
+# ****************************************************************************************
+
+
+class TraceConsumer:
+    # Consumer of a supervisor, read and configured through attributes like the ones of ConsumptionManager
+
+    def __init__(self, name: str):
+        self.name = name
+        self.enabled = False
+        self.accu = 0
+
+
+class TraceSupervisor:
+    def __init__(self):
+        self.regeneration_value = 10
+        self.registered_consumers = [TraceConsumer('tx'), TraceConsumer('rx')]
+
+    def consumers(self) -> list:
+        return self.registered_consumers
+
+    def consumer(self, name: str) -> TraceConsumer:
+        return next(consumer for consumer in self.registered_consumers if consumer.name == name)
+
+
+def create_trace_meter():
+    # mocked meter with a configured history log holding TRACE_LOG_ENTRIES entries
+    from meter_interaction.itep_mock import ItepMock
+
+    meter = ItepMock()
+    send_command(meter, "controlHistoryLog", "01")
+    send_command(meter, "configureHistoryLogDataset", int_to_hex_string(TRACE_DATA_SELECTOR, 2))
+    send_command(meter, 'deleteHistoryLog')
+    for _ in range(TRACE_LOG_ENTRIES):
+        send_command(meter, 'triggerHistoryLogDatasetGeneration', '')
+    return meter
+
+
+def failing_call(role):
+    raise Exception(f'Role {role} is not supported')
+
+
+def run_traced_session(init, trace, set_operation_mode, supervisor) -> list:
+    # The same commands, fixture calls and supervisor accesses are sent while recording and while replaying
+    send = trace.wrap(TRACE_NODEID, send_command)
+    results = [send(init, 'getHistoryLogInfo', return_parameters=['nrOfEntries', 'dataSize'])]
+    for index in range(TRACE_LOG_ENTRIES):
+        results.append(send(init, 'readHistoryLog', parameters=int_to_hex_string(index, 2) + '01',
+                            return_parameters=['dataSet']))
+    results.append(trace.wrap_call(TRACE_NODEID, 'set_operation_mode', set_operation_mode)('FIELD'))
+    try:
+        trace.wrap_call(TRACE_NODEID, 'activate_sitp', failing_call)('SLAVE')
+    except Exception as error:
+        results.append(str(error))
+    for consumer in supervisor.consumers():
+        consumer.enabled = False
+    supervisor.consumer('rx').enabled = True
+    results.append([(consumer.name, consumer.enabled, consumer.accu) for consumer in supervisor.consumers()])
+    results.append(supervisor.regeneration_value)
+    return results
+
+
+@pytest.mark.test_id('1f0d7f67-5b83-4a47-9b3f-1a52f3d0c9d4')
+@pytest.mark.req_ids(['NoReq'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Command trace round trip')
+@allure.description('''This test records commands to a mocked meter, calls of a fixture and accesses to a supervisor
+object into a JSON lines trace file and replays them without the meter and the supervisor, checking that every response,
+error and attribute value is served back as recorded.''')
+def test_command_trace_round_trip(meter_snapshot, tmp_path, monkeypatch):
+    # PRECONDITION BLOCK
+    meter = meter_snapshot('command_trace', create_trace_meter).fork()
+    path = tmp_path / 'trace.jsonl'
+    # traces of the session itself must not record or answer the commands of this test
+    monkeypatch.delitem(TRACES, 'replay', raising=False)
+    monkeypatch.delitem(TRACES, 'record', raising=False)
+
+    # TEST BLOCK
+    recorder = CommandTraceRecorder(path)
+    monkeypatch.setitem(TRACES, 'record', recorder)
+    recorded = run_traced_session(meter, recorder, lambda mode: {'mode': mode},
+                                  TracedObject(TRACE_NODEID, 'supervisor', TraceSupervisor()))
+    recorder.close()
+    monkeypatch.delitem(TRACES, 'record')
+
+    replay = CommandTraceReplay(path)
+    monkeypatch.setitem(TRACES, 'replay', replay)
+    replayed = run_traced_session(ReplayMeter(), replay, None, TracedObject(TRACE_NODEID, 'supervisor'))
+    leftovers = {key: len(responses) for key, responses in replay.responses.items() if responses}
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+
+    allure.attach(f"""
+                                    <h2>Test result</h2>
+                                    <table style="width:100%">
+                                      <tr>
+                                        <th>Recorded:</th>
+                                        <th>Replayed:</th>
+                                        <th>Not replayed:</th>
+                                      </tr>
+                                      <tr align="center">
+                                        <td>{recorded}</td>
+                                        <td>{replayed}</td>
+                                        <td>{leftovers}</td>
+                                      </tr>
+                                    </table>
+                                    """,
+                  'Test result',
+                  allure.attachment_type.HTML)
+
+    # main assertion
+    assert replayed[:-3] == recorded[:-3]
+    assert recorded[-3] in replayed[-3]
+    assert replayed[-2:] == recorded[-2:]
+    assert not leftovers
+    assert all(record['nodeid'] == TRACE_NODEID for record in records)
@@ -0,0 +1,96 @@
+import allure
+import pytest
+
+from support.hydrus2.commands import send_command
+from data_conversion import int_to_hex_string
+from itep_mock_fleet import FleetHistoryLog, MeterFleet, FleetLogStorage, FleetReadoutDriver
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+
+FLEET_DATA_SELECTOR = 0x0C00  # sumVolume and forwardVolume
+FLEET_LOG_ENTRIES = 24  # entries generated in the history log of every meter, one day of hourly entries
+FLEET_SIZES = [10, 100, 1000]
+FLEET_WORKERS = [1, 8]
+
+
+# ***************************************************************************************
+# Local Functions
+# ****************************************************************************************
+
+
+def create_fleet_meter():
+    # mocked meter with a configured history log holding FLEET_LOG_ENTRIES entries, prepared once per session as the
+    # history log every meter of the fleet starts with
+    from meter_interaction.itep_mock import ItepMock
+
+    meter = ItepMock()
+    send_command(meter, "controlHistoryLog", "01")
+    send_command(meter, "configureHistoryLogDataset", int_to_hex_string(FLEET_DATA_SELECTOR, 2))
+    send_command(meter, 'deleteHistoryLog')
+    for _ in range(FLEET_LOG_ENTRIES):
+        send_command(meter, 'triggerHistoryLogDatasetGeneration', '')
+    return meter
+
+
+@pytest.mark.history_log
+@pytest.mark.test_id('ab9bad70-b9e2-4b19-b269-db8e49d046bb')
+@pytest.mark.req_ids(['NoReq'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Fleet history log readout')
+@allure.description('''This test reads the complete history log of every meter of a fleet of mocked meters with a
+pool of workers, checks that every entry of every meter was read and reports how the readout scales with the number of
+meters and workers. The meters of the fleet are views of one preallocated history log storage, which starts with the
+history log of a prepared mocked meter for every meter.''')
+@pytest.mark.parametrize('workers', FLEET_WORKERS)
+@pytest.mark.parametrize('fleet_size', FLEET_SIZES)
+def test_fleet_history_log_readout(meter_snapshot, fleet_size, workers):
+    # PRECONDITION BLOCK
+    meter = meter_snapshot('fleet_history_log', create_fleet_meter).fork()
+    fleet = MeterFleet(FleetHistoryLog.from_meter(meter, fleet_size, capacity=FLEET_LOG_ENTRIES))
+    storage = FleetLogStorage(fleet_size, fleet.log.stride, capacity=FLEET_LOG_ENTRIES)
+
+    # TEST BLOCK
+    report = FleetReadoutDriver(fleet, storage, workers=workers).run()
+    reference_entries = bytes(storage.entries(0))
+    incomplete_meters = [meter for meter in range(fleet_size) if storage.lengths[meter] != FLEET_LOG_ENTRIES
+                         or storage.entries(meter) != reference_entries]
+
+    allure.attach(f"""
+                                    <h2>Test result</h2>
+                                    <table style="width:100%">
+                                      <tr>
+                                        <th>Meters:</th>
+                                        <th>Workers:</th>
+                                        <th>Entries:</th>
+                                        <th>Requests:</th>
+                                        <th>Duration [s]:</th>
+                                        <th>Meters/s:</th>
+                                        <th>Entries/s:</th>
+                                        <th>Meter readout time [s]:</th>
+                                        <th>Failed meters:</th>
+                                        <th>Incomplete meters:</th>
+                                      </tr>
+                                      <tr align="center">
+                                        <td>{report.meters}</td>
+                                        <td>{report.workers}</td>
+                                        <td>{report.entries}</td>
+                                        <td>{report.requests}</td>
+                                        <td>{report.duration:.3f}</td>
+                                        <td>{report.meters_rate:.1f}</td>
+                                        <td>{report.entries_rate:.1f}</td>
+                                        <td>{report.meter_latencies}</td>
+                                        <td>{report.failed_meters[:10]}</td>
+                                        <td>{incomplete_meters[:10]}</td>
+                                      </tr>
+                                    </table>
+                                    """,
+                  'Test result',
+                  allure.attachment_type.HTML)
+
+    # main assertion
+    assert not report.failed_meters
+    assert report.entries == fleet_size * FLEET_LOG_ENTRIES
+    assert not incomplete_meters
@@ -1,59 +1,23 @@
-import struct
-from datetime import datetime
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
 
 import allure
 import pytest
-from time import sleep, time
-from enum import Enum
-from random import randint
+from time import sleep
 
-from meter_interaction.com_interactions import send_command_return_response
-from meter_interaction.itep_mock import ItepMock
+from data_conversion import int_to_hex_string, hex_string_to_int
+from history_log_layout import HistoryLogDataSetSizes, HISTORY_LOG_DATA_SET_BIT_SIZES, get_selector_data_size
+from support.hydrus2.commands import send_command, disable_ultrasonic_simulation
+from support.meter_types import OperationMode, MeterOperation, MeterMode, UltrasonicSimulationMode
 
-from support.commands_usage import call_command_to_delete_log, is_locked_storage_operation, lock_storage_mode
-from meter_interaction import com_interactions
-from support.hydrus2.commands import send_command, set_volume_accus, trigger_function, disable_ultrasonic_simulation
-from support.hydrus2.communication import close_irda_communication_window, CommunicationMode
-from support.hydrus2.errors import CiFieldError
-from support.meter_types import OperationMode, MeterOperation, MeterMode, TriggerFunction, UltrasonicSimulationMode
-from support.data_parser import reverse_stream, int_to_lsb
+if TYPE_CHECKING:
+    from meter_interaction.itep_mock import ItepMock
 
 # ***************************************************************************************
 # lists and dictionaries
 # ****************************************************************************************
-HistoryLogDataSetSizes = {
-    'dateTimeTypeG': 2,
-    'dateTimeTypeF': 4,
-    'sumVolume': 4,
-    'forwardVolume': 4,
-    'backwardVolume': 4,
-    'currentFlow': 3,
-    'maximumFlow': 3,
-    'minimumFlow': 3,
-    'mediumTemp': 2,
-    'ambientTemp': 2,
-    'operatingHours': 3,
-    'errorHours': 2,
-    'errorState': 4,
-}
-
-
-class HistoryLogDataSetBitPlaces(Enum):
-    DATETIME_TYPE_G = 0x0100
-    DATETIME_TYPE_F = 0x0200
-    VOLUME_SUM = 0x0400
-    VOLUME_FORWARD = 0x0800
-    VOLUME_BACKWARD = 0x1000
-    FLOW_CURRENT = 0x2000
-    FLOW_MAXIMUM = 0x4000
-    FLOW_MINIMUM = 0x8000
-    TEMP_MEDIUM = 0x0001
-    TEMP_AMBIENT = 0x0002
-    OPERATING_HOURS = 0x0004
-    ERROR_HOURS = 0x0008
-    ERROR_STATE = 0x0010
-
-
 HISTORY_LOG_DATA_SETS_AMOUNT = 14
 HISTORY_LOG_DATA_SETS = [
     256,  # dateTimeTypeG
@@ -177,6 +141,31 @@ INDEX_1023 = 'FF 03'
 INDEX_30 = '1E 00'
 INDEX_31 = '1F 00'
 INTERVAL_SELECTOR = "0C 00"
+SELECTOR_SWEEP_WORKERS = os.cpu_count()
+INTERVAL_DRIVER_START = datetime(2021, 12, 31)  # 31.12.21 00:00
+# simulated time span and number of RTC jumps between nrOfEntries checks for every logging interval, every span has
+# fewer boundaries than the 1000 entries of the log, so the log never fills up and every boundary is checked
+INTERVAL_DRIVER_SPANS = {'yearly': timedelta(days=3653),
+                         'monthly_middle': timedelta(days=1826),
+                         'monthly_end': timedelta(days=1826),
+                         'weekly_sunday': timedelta(days=731),
+                         'weekly_monday': timedelta(days=731),
+                         'weekly_tuesday': timedelta(days=731),
+                         'weekly_wednesday': timedelta(days=731),
+                         'weekly_thursday': timedelta(days=731),
+                         'weekly_friday': timedelta(days=731),
+                         'weekly_saturday': timedelta(days=731),
+                         'daily': timedelta(days=365),
+                         'hourly': timedelta(days=41)}
+INTERVAL_DRIVER_BATCHES = {'daily': 7, 'hourly': 24}
+WEEKDAYS = {'weekly_monday': 0,
+            'weekly_tuesday': 1,
+            'weekly_wednesday': 2,
+            'weekly_thursday': 3,
+            'weekly_friday': 4,
+            'weekly_saturday': 5,
+            'weekly_sunday': 6}
+SWEEP_METERS = []  # meter of the current sweep worker process
 
 
 # ***************************************************************************************
@@ -214,11 +203,141 @@ def preconditions(init, selector, role, set_operation_mode, activate_sitp, max_e
     return logs_info
 
 
-def int_to_hex_string(integer: int, num_bytes: int) -> str:
-    return integer.to_bytes(num_bytes, 'little').hex().upper()
+def get_all_data_selectors() -> list:
+    # every non-empty combination of the history log data set bits
+    mask = sum(HISTORY_LOG_DATA_SET_BIT_SIZES)
+    return [selector for selector in range(1, mask + 1) if selector & ~mask == 0]
+
+
+def create_history_log_meter():
+    from meter_interaction.itep_mock import ItepMock
+
+    meter = ItepMock()
+    send_command(meter, "controlHistoryLog", "01")
+    return meter
+
+
+def init_selector_sweep_worker(meter_factory):
+    SWEEP_METERS.append(meter_factory())
+
+
+def check_data_selector(selector: int) -> tuple:
+    # configure the data set on the worker's meter and compare reported and read entry size with the expected one
+    meter = SWEEP_METERS[0]
+    send_command(meter, "configureHistoryLogDataset", int_to_hex_string(selector, 2))
+    send_command(meter, 'deleteHistoryLog')
+    send_command(meter, 'triggerHistoryLogDatasetGeneration', '')
+    data_size = hex_string_to_int(send_command(meter, 'getHistoryLogInfo', return_parameters=['dataSize'])['dataSize'])
+    entry = send_command(meter, "readHistoryLog", parameters="00 00 01", return_parameters=["dataSet"])['dataSet']
+    entry_length = len(entry.replace(" ", "")) // 2
+    return selector, get_selector_data_size(selector), data_size, entry_length
+
+
+def sweep_data_selectors(selectors: list, meter_factory=create_history_log_meter,
+                         workers: int = SELECTOR_SWEEP_WORKERS) -> list:
+    # shard the selectors across a pool of processes with one meter each, return the mismatching results. The meter
+    # factory has to return a meter with the history log enabled.
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_selector_sweep_worker,
+                             initargs=(meter_factory,)) as executor:
+        results = executor.map(check_data_selector, selectors, chunksize=max(1, len(selectors) // (workers * 8)))
+        return [result for result in results if not result[1] == result[2] == result[3]]
+
+
+def datetime_to_typef(date: datetime) -> str:
+    # dateTimeTypeF (LSB first): minute, hour, day with low bits of year, month with high bits of year
+    year = date.year % 100
+    data = bytes([date.minute, date.hour, date.day | (year & 0x07) << 5, date.month | (year >> 3) << 4])
+    return data.hex(' ').upper()
+
+
+def next_interval_boundary(interval: str, moment: datetime) -> datetime:
+    # first moment after the given one at which a history log entry is generated for the logging interval
+    hour = moment.replace(minute=0, second=0, microsecond=0)
+    midnight = hour.replace(hour=0)
+    if interval == 'hourly':
+        return hour + timedelta(hours=1)
+    if interval == 'daily':
+        return midnight + timedelta(days=1)
+    if interval in WEEKDAYS:
+        return midnight + timedelta(days=(WEEKDAYS[interval] - midnight.weekday() - 1) % 7 + 1)
+    if interval == 'yearly':
+        return midnight.replace(year=midnight.year + 1, month=1, day=1)
+    next_month = (midnight.replace(day=1) + timedelta(days=32)).replace(day=1)
+    if interval == 'monthly_end':
+        return next_month
+    if interval == 'monthly_middle':
+        middle = midnight.replace(day=15)
+        return middle if middle > moment else next_month.replace(day=15)
+    raise Exception(f'Unknown logging interval {interval}')
+
+
+def get_interval_boundaries(interval: str, start: datetime, end: datetime) -> list:
+    boundaries = []
+    boundary = next_interval_boundary(interval, start)
+    while boundary <= end:
+        boundaries.append(boundary)
+        boundary = next_interval_boundary(interval, boundary)
+    return boundaries
+
+
+def drive_history_log_interval(init, interval: str, start: datetime, end: datetime, batch_size: int = 1,
+                               capacity: int = 1000) -> tuple:
+    # jump the RTC from one interval boundary straight to the next one and check after every batch of jumps
+    # that nrOfEntries grew by one per boundary, the log must not fill up within the span
+    send_command(init, "configureHistoryLogInterval", intervals_dict[interval])
+    send_command(init, 'Set_rtcDateAndTime', datetime_to_typef(start))
+    nr_of_entries = hex_string_to_int(get_logs_info(init)['nrOfEntries'])
+    boundaries = get_interval_boundaries(interval, start, end)
+    if nr_of_entries + len(boundaries) >= capacity:
+        raise Exception(f'{len(boundaries)} {interval} boundaries after {nr_of_entries} entries fill the log of '
+                        f'{capacity} entries, nrOfEntries would not be checked for every boundary')
+    mismatches = []
+    for index in range(0, len(boundaries), batch_size):
+        batch = boundaries[index:index + batch_size]
+        for boundary in batch:
+            send_command(init, 'Set_rtcDateAndTime', datetime_to_typef(boundary))
+        expected_nr_of_entries = nr_of_entries + len(batch)
+        nr_of_entries = hex_string_to_int(get_logs_info(init)['nrOfEntries'])
+        if nr_of_entries != expected_nr_of_entries:
+            mismatches.append((batch[-1], expected_nr_of_entries, nr_of_entries))
+    return boundaries, mismatches
+
+
+def create_interval_meter():
+    # mocked meter with an empty history log of 1000 entries of all data sets, the logging interval is set by the test
+    from meter_interaction.itep_mock import ItepMock
+
+    meter = ItepMock()
+    send_command(meter, "controlHistoryLog", "01")
+    send_command(meter, "configureHistoryLogDataset", int_to_hex_string(HISTORY_LOG_DATA_SELECTOR['ALL'], 2))
+    send_command(meter, "setMaximalAmountOfHistoryLogEntries", 'E8 03')
+    send_command(meter, 'deleteHistoryLog')
+    return meter
+
+
+def allure_attach_interval_boundaries(interval: str, end: datetime, boundaries: list, mismatches: list):
+    allure.attach(f"""
+                                    <h2>Test result</h2>
+                                    <table style="width:100%">
+                                      <tr>
+                                        <th>Interval:</th>
+                                        <th>Simulated span:</th>
+                                        <th>Boundaries:</th>
+                                        <th>Mismatches:</th>
+                                      </tr>
+                                      <tr align="center">
+                                        <td>{interval}</td>
+                                        <td>{INTERVAL_DRIVER_START} - {end}</td>
+                                        <td>{len(boundaries)}</td>
+                                        <td>{mismatches}</td>
+                                      </tr>
+                                    </table>
+                                    """,
+                  'Test result',
+                  allure.attachment_type.HTML)
 
 
-def simulate_flow(init: ItepMock, ultrasonic_simulation, direction: str = "forward"):
+def simulate_flow(init: 'ItepMock', ultrasonic_simulation, direction: str = "forward"):
     phase_shift_int = 550 if direction == 'forward' else -550
     ultrasonic_simulation(simulation_mode=UltrasonicSimulationMode.NORMAL, phase_shift_diff=phase_shift_int * 1024,
                           medium_temperature=270, resonator_calibration=False, time_difference_1us=4000,
@@ -285,7 +404,7 @@ digit after coma).''')
 @pytest.mark.parametrize('role', ['REP', 'LAB', 'TES', 'UTL'])  # ['REP', 'LAB', 'TES', 'UTL']
 @pytest.mark.parametrize('selector', ['06 13'])  # TimeTypeF, SumVol, MedTemp, AmbTemp, ErrState
 def test_history_log_reading_data_and_resolution(init, activate_sitp, set_operation_mode, role, mode, selector,
-                                                 ultrasonic_simulation):
+                                                 ultrasonic_simulation, restore_state, read_in_sequence):
     # PRECONDITION BLOCK
     send_command(init, 'triggerHistoryLogDatasetGeneration', '')
     send_command(init, 'Set_ldacm_data_volumeDefinitionsAccu1', int_to_hex_string(21152115, 10))
@@ -302,26 +421,21 @@ def test_history_log_reading_data_and_resolution(init, activate_sitp, set_operat
     # set op mode to parametrised
     set_operation_mode(OperationMode(mode=mode, operation=MeterOperation.NORMAL))
     # TEST BLOCK
-    # read forward volume from accu
-    forward_volume = send_command(init, 'Get_ldacm_data_volumeDefinitionsAccu1',
-                                  return_parameters=["ldacm_data_volumeDefinitionsAccu1"])[
-        "ldacm_data_volumeDefinitionsAccu1"]
-    # read backward volume from accu
-    back_volume = send_command(init, 'Get_ldacm_data_volumeDefinitionsAccu2',
-                               return_parameters=["ldacm_data_volumeDefinitionsAccu2"])[
-        "ldacm_data_volumeDefinitionsAccu2"]
-    # read current medium temperature
-    medium_temp = send_command(init, 'TestTemperatureMeasurement',
-                               return_parameters=["ntc temperature"])["ntc temperature"]
-    # read error state
-    error_state = send_command(init, 'getErrorState',
-                               return_parameters=["pendingErrors"])["pendingErrors"]
-
-    # read maximum forward flowrate
-    # TODO: no command supplied yet
-    # read current flowrate
-    current_flowrate = send_command(init, 'Get_ldacm_data_selfDisclosure_flowRateQ3',
-                                    return_parameters=["ldacm_data_selfDisclosure_flowRateQ3"])[
+    # read reference values in one sequence: forward and backward volume from accus, current medium temperature,
+    # error state and current flowrate
+    # TODO: read maximum forward flowrate, no command supplied yet
+    reference = read_in_sequence(init, [
+        ('Get_ldacm_data_volumeDefinitionsAccu1', None, ["ldacm_data_volumeDefinitionsAccu1"]),
+        ('Get_ldacm_data_volumeDefinitionsAccu2', None, ["ldacm_data_volumeDefinitionsAccu2"]),
+        ('TestTemperatureMeasurement', None, ["ntc temperature"]),
+        ('getErrorState', None, ["pendingErrors"]),
+        ('Get_ldacm_data_selfDisclosure_flowRateQ3', None, ["ldacm_data_selfDisclosure_flowRateQ3"]),
+    ])
+    forward_volume = reference['Get_ldacm_data_volumeDefinitionsAccu1', None]["ldacm_data_volumeDefinitionsAccu1"]
+    back_volume = reference['Get_ldacm_data_volumeDefinitionsAccu2', None]["ldacm_data_volumeDefinitionsAccu2"]
+    medium_temp = reference['TestTemperatureMeasurement', None]["ntc temperature"]
+    error_state = reference['getErrorState', None]["pendingErrors"]
+    current_flowrate = reference['Get_ldacm_data_selfDisclosure_flowRateQ3', None][
         "ldacm_data_selfDisclosure_flowRateQ3"]
     for i in range(0, 30):
         send_command(init, 'triggerHistoryLogDatasetGeneration', '')
@@ -367,8 +481,9 @@ def test_history_log_reading_data_and_resolution(init, activate_sitp, set_operat
                   'Test result',
                   allure.attachment_type.HTML)
 
-    # back to default mode
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # back to default mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
     send_command(init, 'controlMetrologicalLog', parameters='02')
@@ -449,8 +564,8 @@ def test_history_log_timestamps(init, activate_sitp, set_operation_mode):
 log. If the log is full new entries should overwrite oldest entries.''')
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP', 'LAB', 'TES', 'UTL'])
-def test_history_log_max_number_of_entries(init, mode, role, ultrasonic_simulation,
-                                           activate_sitp, set_operation_mode):
+def test_history_log_max_number_of_entries(init, mode, role, flow_profile,
+                                           activate_sitp, set_operation_mode, restore_state):
     # PRECONDITION BLOCK
     # handle preconditions
     # check if history log is empty
@@ -465,13 +580,15 @@ def test_history_log_max_number_of_entries(init, mode, role, ultrasonic_simulati
     send_command(init, "setMaximalAmountOfHistoryLogEntries", int_to_hex_string(1096, 2))
     # check if the change was propagated (only UTL or TES)
     log_info_after_change = get_logs_info(init)
+    # keep forward flow running while the entries are generated
+    flow_profile.start('forward')
     for i in range(0, 1096):
         nr_of_entries_pre_loop = get_logs_info(init)['nrOfEntries']
-        simulate_flow(init, ultrasonic_simulation)
         send_command(init, 'triggerHistoryLogDatasetGeneration', '')
         nr_of_entries_post_loop = get_logs_info(init)['nrOfEntries']
         if nr_of_entries_pre_loop != nr_of_entries_post_loop - 1:
             raise Exception("Entry" + str(i) + "wasn't added!")
+    flow_profile.stop()
     log_info_before_rollout = get_logs_info(init)
     instance_status_before_rollout = log_info_before_rollout['instanceStatus']
     num_log_entries_before_rollout = log_info_before_rollout['nrOfLogEntries']
@@ -517,8 +634,9 @@ def test_history_log_max_number_of_entries(init, mode, role, ultrasonic_simulati
                   allure.attachment_type.HTML)
     # reset history log
     send_command(init, 'deleteHistoryLog', '')
-    # back to default mode
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # back to default mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
     send_command(init, 'controlMetrologicalLog', parameters='02')
@@ -541,13 +659,14 @@ history log deletion. These are: 'Set_ldacm_data_outputVolumeDecimalPlace', 'con
 @pytest.mark.parametrize('command_set, command_get, command_ret', [('Set_ldacm_data_outputVolumeDecimalPlace',
                                                                     'Get_ldacm_data_outputVolumeDecimalPlace',
                                                                     'ldacm_data_outputVolumeDecimalPlace'),
-                                                                   ('configureDigitHighlighting,'
-                                                                    ' "get_dummy',
-                                                                    "return_param_dummy")])
+                                                                   ('configureDigitHighlighting',
+                                                                    'get_dummy',
+                                                                    'return_param_dummy')])
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP', 'LAB', 'TES', 'UTL'])
 def test_history_log_deleting_log_by_different_commands(init, activate_sitp, set_operation_mode, role, mode,
-                                                        ultrasonic_simulation, command_set, command_get, command_ret):
+                                                        ultrasonic_simulation, command_set, command_get, command_ret,
+                                                        restore_state):
     # PRECONDITION BLOCK
 
     # simulate flow
@@ -610,8 +729,9 @@ def test_history_log_deleting_log_by_different_commands(init, activate_sitp, set
                   'Test result',
                   allure.attachment_type.HTML)
 
-    # back to default mode
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # back to default mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
 
@@ -634,7 +754,7 @@ should be generated automatically after logging interval time passes.''')
 @pytest.mark.parametrize('role', ['REP', 'LAB', 'TES', 'UTL'])
 @pytest.mark.parametrize('interval', ["daily", "hourly"])
 def test_history_log_logging_interval(init, activate_sitp, set_operation_mode, role, mode,
-                                      interval):
+                                      interval, restore_state):
     # PRECONDITION BLOCK
     # common precondition handling
     # check if history log is empty
@@ -645,11 +765,11 @@ def test_history_log_logging_interval(init, activate_sitp, set_operation_mode, r
     # enter production mode
     set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
     # TEST BLOCK
-    start_time = '00 00 BF 2C'  # 31.12.21 00:00
+    start_time = datetime_to_typef(INTERVAL_DRIVER_START)  # 31.12.21 00:00
     send_command(init, 'Set_rtcDateAndTime', start_time)
     send_command(init, "configureHistoryLogInterval", intervals_dict[interval])
-    # trigger history log generation, 1 hour interval
-    start_time_interval = '00 01 BF 2C' if interval == 'hourly' else '00 00 C1 21'  # 31.12.21 01:00 or 01.01.2022
+    # trigger history log generation, 31.12.21 01:00 or 01.01.2022
+    start_time_interval = datetime_to_typef(next_interval_boundary(interval, INTERVAL_DRIVER_START))
     send_command(init, 'Set_rtcDateAndTime', start_time_interval)
 
     # read log content
@@ -681,8 +801,9 @@ def test_history_log_logging_interval(init, activate_sitp, set_operation_mode, r
                   'Test result',
                   allure.attachment_type.HTML)
 
-    # back to default mode
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # back to default mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
     send_command(init, 'controlMetrologicalLog', parameters='02')
@@ -704,7 +825,7 @@ def test_history_log_logging_interval(init, activate_sitp, set_operation_mode, r
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP', 'LAB', 'TES', 'UTL'])
 def test_history_log_after_reset(init, activate_sitp, set_operation_mode, role, mode,
-                                 ultrasonic_simulation):
+                                 flow_profile, restore_state, history_log_buffer, reset_and_wait_ready):
     # PRECONDITION BLOCK
     # check if history log is empty
     # also save log info for later
@@ -712,23 +833,23 @@ def test_history_log_after_reset(init, activate_sitp, set_operation_mode, role,
 
     # TEST BLOCK
     # generate 100 logs with flow simulation in between
-    # store added entries in a list
-    entries_before_reset = []
+    # store added entries in a buffer
+    entries_before_reset = history_log_buffer(capacity=100)
+    # keep forward flow running while the entries are generated
+    flow_profile.start('forward')
     for i in range(0, 100):
-        # simulate flow
-        simulate_flow(init, ultrasonic_simulation)
         # trigger history log generation
         send_command(init, 'triggerHistoryLogDatasetGeneration', '')
         # save entries in a list
         entries_before_reset.append(
             send_command(init, "readHistoryLog", parameters="00 00 01", return_parameters=["dataSet"])['dataSet'])
+    flow_profile.stop()
     # save the number of entries in log along with the number of possible entries and other log info
     log_info_before = get_logs_info(init)
     # reset the meter and wait for the meter to go back online
-    send_command(init, 'LowLevelPowerAndReset', parameters='06')
-    sleep(2)
-    # store entries after reset in a list
-    entries_after_reset = []
+    reset_and_wait_ready(init, '06')
+    # store entries after reset in a buffer
+    entries_after_reset = history_log_buffer(capacity=100)
     for i in reversed(range(0, 100)):
         entries_after_reset.append(
             send_command(init, "readHistoryLog", parameters=int_to_hex_string(i, 2) + "01", return_parameters=["dataSet"])[
@@ -765,9 +886,10 @@ def test_history_log_after_reset(init, activate_sitp, set_operation_mode, role,
                   'Test result',
                   allure.attachment_type.HTML)
 
-    # delete log and back to default mode
+    # delete log and back to default mode, unless the next test starts from the same state
     send_command(init, 'deleteHistoryLog', '')
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
     send_command(init, 'controlMetrologicalLog', parameters='02')
@@ -789,7 +911,7 @@ def test_history_log_after_reset(init, activate_sitp, set_operation_mode, role,
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP', 'LAB', 'TES', 'UTL'])
 def test_history_log_generating_and_deleting_entries(init, activate_sitp, set_operation_mode, role, mode,
-                                                     ultrasonic_simulation):
+                                                     ultrasonic_simulation, restore_state):
     # PRECONDITION BLOCK
     # check if history log is empty
     log_info_before = preconditions(init, int_to_hex_string(HISTORY_LOG_DATA_SELECTOR['ALL'], 2), role, set_operation_mode, activate_sitp)
@@ -837,8 +959,9 @@ def test_history_log_generating_and_deleting_entries(init, activate_sitp, set_op
                   'Test result',
                   allure.attachment_type.HTML)
 
-    # back to default mode
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # back to default mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
     send_command(init, 'controlMetrologicalLog', parameters='02')
@@ -867,7 +990,7 @@ def test_history_log_generating_and_deleting_entries(init, activate_sitp, set_op
                                        ("mediumTemp", "maxForward", "errorState"),
                                        ("sumVolume", "currentFlow", "maxForward"), ("ALL",)])
 def test_history_log_reading_selected_data(init, activate_sitp, set_operation_mode, role, mode,
-                                           selectors):
+                                           selectors, restore_state):
     # PRECONDITION BLOCK
     send_command(init, 'triggerHistoryLogDatasetGeneration', '')
     send_command(init, 'Set_ldacm_data_volumeDefinitionsAccu1', int_to_hex_string(21152115, 10))
@@ -918,11 +1041,109 @@ def test_history_log_reading_selected_data(init, activate_sitp, set_operation_mo
                   'Test result',
                   allure.attachment_type.HTML)
 
-    # back to default mode
-    set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # back to default mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(mode=MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
     # reset metrological log to be sure is not full after open/close metrological accesses
     send_command(init, 'controlMetrologicalLog', parameters='02')
 
     # main assertion
     assert actual_entry_length == sel_data_size
+
+
+@pytest.mark.history_log
+@pytest.mark.test_id('fed35d4f-2ce1-4c79-a698-c6e078a431cb')
+@pytest.mark.req_ids(['NoReq'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Reading log with every dataset combination')
+@allure.description('''This test configures every valid combination of history log datasets on a pool of mocked 
+meters and checks if the reported dataSize and the length of the logged entry match the selected datasets.''')
+def test_history_log_data_selector_sweep(meter_snapshot):
+    selectors = get_all_data_selectors()
+    mismatches = sweep_data_selectors(selectors, meter_factory=meter_snapshot('history_log', create_history_log_meter))
+
+    rows = "".join(f"""
+                                      <tr align="center">
+                                        <td>{int_to_hex_string(selector, 2)}</td>
+                                        <td>{expected_size}</td>
+                                        <td>{data_size}</td>
+                                        <td>{entry_length}</td>
+                                      </tr>""" for selector, expected_size, data_size, entry_length in mismatches)
+    allure.attach(f"""
+                                    <h2>Test result</h2>
+                                    <p>Checked selectors: {len(selectors)}, mismatches: {len(mismatches)}</p>
+                                    <table style="width:100%">
+                                      <tr>
+                                        <th>Selector:</th>
+                                        <th>Expected data size:</th>
+                                        <th>Reported data size:</th>
+                                        <th>Entry length:</th>
+                                      </tr>{rows}
+                                    </table>
+                                    """,
+                  'Test result',
+                  allure.attachment_type.HTML)
+
+    # main assertion
+    assert not mismatches
+
+
+@pytest.mark.history_log
+@pytest.mark.test_id('1328ffea-a6b3-45a1-9392-a8d75e2ce2b2')
+@pytest.mark.req_ids(['F435', 'F436'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Logging interval boundaries')
+@allure.description('''This test jumps the RTC over every boundary of the logging interval in a simulated time span 
+and checks if exactly one history log entry is generated per boundary.''')
+@pytest.mark.parametrize('role', ['UTL'])
+@pytest.mark.parametrize('interval', list(intervals_dict))
+def test_history_log_logging_interval_boundaries(init, activate_sitp, set_operation_mode, role, interval):
+    # PRECONDITION BLOCK
+    log_info = preconditions(init, int_to_hex_string(HISTORY_LOG_DATA_SELECTOR['ALL'], 2), role,
+                             set_operation_mode, activate_sitp)
+    capacity = hex_string_to_int(log_info['nrOfPossibleEntries'])
+
+    # TEST BLOCK
+    end = INTERVAL_DRIVER_START + INTERVAL_DRIVER_SPANS[interval]
+    boundaries, mismatches = drive_history_log_interval(init, interval, INTERVAL_DRIVER_START, end,
+                                                        INTERVAL_DRIVER_BATCHES.get(interval, 1), capacity)
+
+    allure_attach_interval_boundaries(interval, end, boundaries, mismatches)
+
+    # reset metrological log to be sure is not full after open/close metrological accesses
+    send_command(init, 'controlMetrologicalLog', parameters='02')
+    # delete history log
+    send_command(init, 'deleteHistoryLog', '')
+
+    # main assertion
+    assert boundaries
+    assert not mismatches
+
+
+@pytest.mark.history_log
+@pytest.mark.test_id('6c3ae483-c0db-4b1b-8921-b3d9bd53ff7e')
+@pytest.mark.req_ids(['F435', 'F436'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Logging interval boundaries on a mocked meter')
+@allure.description('''This test jumps the RTC of a mocked meter over every boundary of the logging interval in a
+simulated time span and checks if exactly one history log entry is generated per boundary.''')
+@pytest.mark.parametrize('interval', list(intervals_dict))
+def test_history_log_logging_interval_boundaries_mock(meter_snapshot, interval):
+    # PRECONDITION BLOCK
+    meter = meter_snapshot('history_log_intervals', create_interval_meter).fork()
+    capacity = hex_string_to_int(get_logs_info(meter)['nrOfPossibleEntries'])
+
+    # TEST BLOCK
+    end = INTERVAL_DRIVER_START + INTERVAL_DRIVER_SPANS[interval]
+    boundaries, mismatches = drive_history_log_interval(meter, interval, INTERVAL_DRIVER_START, end,
+                                                        INTERVAL_DRIVER_BATCHES.get(interval, 1), capacity)
+
+    allure_attach_interval_boundaries(interval, end, boundaries, mismatches)
+
+    # main assertion
+    assert boundaries
+    assert not mismatches
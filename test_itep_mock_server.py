@@ -0,0 +1,172 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import allure
+import pytest
+
+from data_conversion import int_to_hex_string
+from itep_mock_server import ItepMockClient, send_client_command as send_command
+from meter_link import get_meter_link
+
+# ***************************************************************************************
+# Global parameters
+# ****************************************************************************************
+
+SERVER_DATA_SELECTOR = 0x0C00  # sumVolume and forwardVolume
+SERVER_LOG_ENTRIES = 5
+SERVER_METERS = 2
+SERVER_CLIENTS = 4
+SERVER_TIMEOUT = 10  # [s]
+INVALID_REQUESTS = ['[1, 2]', '"getErrorState"', '{"id": 1, "meter": 99, "command": "getErrorState"}', '{']
+DUAL_LINK_READOUTS = 20  # history log readouts over IrDA while L-Bus is polled
+
+
+# ***************************************************************************************
+# Local Functions
+# ****************************************************************************************
+
+
+def create_server_meter():
+    # mocked meter with a configured history log holding SERVER_LOG_ENTRIES entries
+    from meter_interaction.itep_mock import ItepMock
+
+    meter = ItepMock()
+    send_command(meter, "controlHistoryLog", "01")
+    send_command(meter, "configureHistoryLogDataset", int_to_hex_string(SERVER_DATA_SELECTOR, 2))
+    send_command(meter, 'deleteHistoryLog')
+    for _ in range(SERVER_LOG_ENTRIES):
+        send_command(meter, 'triggerHistoryLogDatasetGeneration', '')
+    return meter
+
+
+def read_history_log(init) -> list:
+    entries = [send_command(init, 'getHistoryLogInfo', return_parameters=['nrOfEntries', 'dataSize'])]
+    for index in range(SERVER_LOG_ENTRIES):
+        entries.append(send_command(init, 'readHistoryLog', parameters=int_to_hex_string(index, 2) + '01',
+                                    return_parameters=['dataSet']))
+    return entries
+
+
+def read_history_log_through_client(address, meter: int) -> list:
+    with ItepMockClient(address, meter=meter, timeout=SERVER_TIMEOUT) as client:
+        return read_history_log(client)
+
+
+def send_raw_request(client: ItepMockClient, line: str) -> dict:
+    client.stream.write(line.encode() + b'\n')
+    client.stream.flush()
+    return json.loads(client.stream.readline())
+
+
+@pytest.mark.test_id('0c3b5a53-3f0e-4d5e-b8f4-2d7b6e0a9c41')
+@pytest.mark.req_ids(['NoReq'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Mocked meter server round trip')
+@allure.description('''This test serves mocked meters to several clients at the same time, reads the history log of
+every meter through the clients with send_command and compares it with the history log read from the meter directly.
+Invalid requests have to be answered with an error without closing the connection.''')
+def test_itep_mock_server_round_trip(meter_snapshot, itep_mock_server):
+    # PRECONDITION BLOCK
+    snapshot = meter_snapshot('itep_mock_server', create_server_meter)
+    expected = read_history_log(snapshot.fork())
+    server = itep_mock_server([snapshot.fork() for _ in range(SERVER_METERS)])
+
+    # TEST BLOCK
+    with ThreadPoolExecutor(max_workers=SERVER_CLIENTS) as executor:
+        readouts = list(executor.map(read_history_log_through_client, [server.address] * SERVER_CLIENTS,
+                                     [client % SERVER_METERS for client in range(SERVER_CLIENTS)]))
+    with ItepMockClient(server.address, timeout=SERVER_TIMEOUT) as client:
+        invalid_responses = [send_raw_request(client, line) for line in INVALID_REQUESTS]
+        after_invalid = send_command(client, 'getHistoryLogInfo', return_parameters=['nrOfEntries', 'dataSize'])
+    metrics = dict(server.metrics)
+
+    allure.attach(f"""
+                                    <h2>Test result</h2>
+                                    <table style="width:100%">
+                                      <tr>
+                                        <th>Meters:</th>
+                                        <th>Clients:</th>
+                                        <th>Server metrics:</th>
+                                        <th>Invalid request responses:</th>
+                                      </tr>
+                                      <tr align="center">
+                                        <td>{SERVER_METERS}</td>
+                                        <td>{SERVER_CLIENTS}</td>
+                                        <td>{metrics}</td>
+                                        <td>{invalid_responses}</td>
+                                      </tr>
+                                    </table>
+                                    """,
+                  'Test result',
+                  allure.attachment_type.HTML)
+
+    # main assertion
+    assert all(readout == expected for readout in readouts)
+    assert all('error' in response for response in invalid_responses)
+    assert after_invalid == expected[0]
+    assert metrics['connections'] == SERVER_CLIENTS + 1
+    assert metrics['errors'] == len(INVALID_REQUESTS)
+
+
+@pytest.mark.test_id('b7e4c2d9-6a1f-4f38-9e0b-3d5a8c1f7e62')
+@pytest.mark.req_ids(['NoReq'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('L-Bus and IrDA links to one mocked meter at the same time')
+@allure.description('''This test opens two connections to the same served mocked meter, polls the error state over the
+L-Bus connection from a background thread while the history log is read over the IrDA connection, and checks that both
+links made progress at the same time and that the traffic of every link is counted on its own link.''')
+def test_itep_mock_server_dual_link(meter_snapshot, itep_mock_server):
+    # PRECONDITION BLOCK
+    snapshot = meter_snapshot('itep_mock_server', create_server_meter)
+    expected = read_history_log(snapshot.fork())
+    server = itep_mock_server([snapshot.fork()])
+    stop_polling = threading.Event()
+    polls = []
+
+    def poll_error_state(init):
+        while not stop_polling.is_set():
+            polls.append(send_command(init, 'getErrorState', return_parameters=['pendingErrors']))
+
+    # TEST BLOCK
+    with ItepMockClient(server.address, timeout=SERVER_TIMEOUT) as lbus_init, \
+            ItepMockClient(server.address, timeout=SERVER_TIMEOUT) as irda_init:
+        lbus_link, irda_link = get_meter_link(lbus_init), get_meter_link(irda_init)
+        irda_link.name = 'irda'
+        poller = threading.Thread(target=poll_error_state, args=(lbus_init,), name='lbus-poller', daemon=True)
+        poller.start()
+        polls_before = len(polls)
+        readouts = [read_history_log(irda_init) for _ in range(DUAL_LINK_READOUTS)]
+        polls_during = len(polls) - polls_before
+        stop_polling.set()
+        poller.join(SERVER_TIMEOUT)
+        lbus_metrics, irda_metrics = dict(lbus_link.metrics), dict(irda_link.metrics)
+
+    allure.attach(f"""
+                                    <h2>Test result</h2>
+                                    <table style="width:100%">
+                                      <tr>
+                                        <th>IrDA readouts:</th>
+                                        <th>L-Bus polls during the readouts:</th>
+                                        <th>L-Bus link:</th>
+                                        <th>IrDA link:</th>
+                                      </tr>
+                                      <tr align="center">
+                                        <td>{len(readouts)}</td>
+                                        <td>{polls_during}</td>
+                                        <td>{lbus_metrics}</td>
+                                        <td>{irda_metrics}</td>
+                                      </tr>
+                                    </table>
+                                    """,
+                  'Test result',
+                  allure.attachment_type.HTML)
+
+    # main assertion
+    assert all(readout == expected for readout in readouts)
+    assert polls_during > 0
+    assert lbus_metrics['commands'] == len(polls)
+    assert irda_metrics['commands'] == DUAL_LINK_READOUTS * len(expected)
+    assert not lbus_metrics['errors'] and not irda_metrics['errors']
@@ -1,12 +1,14 @@
 import pytest
 import allure
-from time import sleep
+from contextlib import nullcontext
+from math import sqrt
+from time import sleep, monotonic
+from typing import NamedTuple
 
+from data_conversion import int_to_hex_string, hex_string_to_int, get_percentile
 from support.hydrus2.consumption_manager import ConsumptionManager
 from support.hydrus2.communication import send_command
-from support.meter_types import OperationMode, MeterMode, MeterOperation, UltrasonicSimulationMode
-from tests.conftest import ultrasonic_simulation
-from support.hydrus2.commands import disable_ultrasonic_simulation
+from support.meter_types import OperationMode, MeterMode, MeterOperation
 
 # **********************************
 # Global parameters and dictionaries
@@ -20,8 +22,215 @@ CONSUMER_ENABLE = {
     'All': '01 01 01',
     'Disable': '00 00 00'
 }
-REGENERATION_TIME = 62
+# Test-local model of the consumption manager, not taken from the meter specification: the accus of the consumers are
+# decreased by regeneration_value once every REGENERATION_PERIOD (the fixed waits of the tests used to be 60 s) and an
+# accu unit is 2 ** quantifier bytes. It only sizes waits and the start of the capacity search, the tests wait for and
+# check the accu read from the meter. The margin covers the phase of the regeneration tick against the start of a wait.
+REGENERATION_PERIOD = 60  # [s] assumed
+REGENERATION_MARGIN = 2  # [s]
+REGENERATION_POLL_INTERVAL = 2  # [s]
+REGENERATION_TIMEOUT = 600  # [s] longest wait for the accu to drop below threshold_underload
 NO_ERRORS = '26 00 00 00 00 00 00'
+# Position of the toMuchCommunication error in the bit string of pendingErrors, as checked by the trigger error test
+TOO_MUCH_COMMUNICATION_BIT = 22
+# Consumers of the supervisors which LoopBackGivenBytes generates traffic for
+SUPERVISOR_CONSUMERS = {'lbus': ['tx', 'rx', 'passive'], 'irda': ['tx', 'rx']}
+# Payload of the traffic generating command, built once instead of on every send
+LOOPBACK_20_BYTES = ' '.join(['00'] * 20)
+EVENT_LOG_MAX_ENTRIES = 255
+EVENT_LOG_POLL_INTERVAL = 0.5
+EVENT_LOG_ENTRY_TIMEOUT = 150  # [s] the error used to be given 120 s to show up in the event log
+# Ring buffer logs: the request and parameter reporting the number of entries, the index of a record (bytes and
+# suffix) and the parameters returned for every record
+RING_BUFFER_LOGS = {
+    'readHistoryLog': {'info': ('getHistoryLogInfo', None), 'count': 'nrOfEntries', 'index': (2, ' 01'),
+                       'fields': ['dataSet']},
+    'ReadLogMetrological': {'info': ('ReadLogMetrological', '00'), 'count': 'availableNumberOfDatasets',
+                            'index': (1, ''), 'fields': ['timeOfChangeAsTypeFFormat']},
+    'ReadEventLogRingBuffer': {'info': ('ReadEventLogRingBuffer', '00'), 'count': 'availableNumberOfDatasets',
+                               'index': (1, ''), 'fields': ['dateTime']},
+}
+# Cyclic INT9 communication: one request every period for the test time
+INT9_REQUEST_PERIOD = 30  # [s]
+INT9_TEST_TIME = 300  # [s]
+TRAFFIC_LATENCY_PERCENTILES = (50, 90, 99)
+# Capacity search: every trial runs for some assumed regeneration periods and the search starts from a multiple of the
+# rate predicted with the assumed model
+CAPACITY_TRIAL_TIME = 3 * REGENERATION_PERIOD  # [s]
+CAPACITY_SEARCH_STEPS = 6
+CAPACITY_SEARCH_HEADROOM = 4
+
+
+# **********************************
+# Ring buffer logs
+# **********************************
+
+
+class RingBufferRecord(NamedTuple):
+    log: str
+    index: int
+    values: dict
+
+
+class RingBufferLogReader:
+    # Reads the number of entries of a ring buffer log once from its info request (unless the test already has it) and
+    # then all records from the oldest to the newest, range after range, one request per record. The meter addresses
+    # records by age, index 0 is the oldest entry also after the log wrapped around, and none of the info requests
+    # reports a write pointer, so the reader does not map indices onto buffer positions itself.
+
+    def __init__(self, init, log: str, count: int = None, range_size: int = 16):
+        self.init = init
+        self.log = log
+        self.info_command, self.info_parameters = RING_BUFFER_LOGS[log]['info']
+        self.count_parameter = RING_BUFFER_LOGS[log]['count']
+        self.index_size, self.index_suffix = RING_BUFFER_LOGS[log]['index']
+        self.fields = RING_BUFFER_LOGS[log]['fields']
+        self.count = count
+        self.range_size = range_size
+
+    def get_count(self) -> int:
+        if self.count is None:
+            if self.info_parameters is None:
+                response = send_command(self.init, self.info_command, return_parameters=[self.count_parameter])
+            else:
+                response = send_command(self.init, self.info_command, self.info_parameters,
+                                        return_parameters=[self.count_parameter])
+            self.count = hex_string_to_int(response[self.count_parameter])
+        return self.count
+
+    def read_range(self, indices: range) -> list:
+        return [RingBufferRecord(self.log, index,
+                                 send_command(self.init, self.log,
+                                              int_to_hex_string(index, self.index_size) + self.index_suffix,
+                                              return_parameters=self.fields))
+                for index in indices]
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        count = self.get_count()
+        for start in range(0, count, self.range_size):
+            yield from self.read_range(range(start, min(start + self.range_size, count)))
+
+    def read(self) -> list:
+        return list(self.records())
+
+
+# **********************************
+# Traffic generation
+# **********************************
+
+
+# Schedules yield the offsets [s] from the start of the run at which requests are sent
+def constant_schedule(rate: float, duration: float):
+    # rate [requests/s]
+    index = 0
+    while index / rate < duration:
+        yield index / rate
+        index += 1
+
+
+def burst_schedule(burst_size: int, period: float, duration: float):
+    # burst_size requests back to back at the start of every period
+    start = 0.0
+    while start < duration:
+        for _ in range(burst_size):
+            yield start
+        start += period
+
+
+def ramp_schedule(start_rate: float, end_rate: float, duration: float):
+    # rate [requests/s] changing linearly from start_rate to end_rate over the duration. Request n is sent when the
+    # integral of the rate reaches n: start_rate * t + slope * t^2 / 2 = n, so a rate of 0 at either end is allowed.
+    slope = (end_rate - start_rate) / duration
+    index = 0
+    while True:
+        if slope:
+            discriminant = start_rate ** 2 + 2 * slope * index
+            if discriminant < 0:
+                return
+            offset = (sqrt(discriminant) - start_rate) / slope
+        elif start_rate > 0:
+            offset = index / start_rate
+        else:
+            return
+        if offset >= duration:
+            return
+        yield offset
+        index += 1
+
+
+class TrafficReport(NamedTuple):
+    requests: int
+    failed_requests: int
+    duration: float  # [s]
+    request_rate: float  # [requests/s]
+    byte_rate: float  # [bytes/s]
+    latencies: dict  # percentile: latency [s]
+    first_blocked: float  # [s] from the start of the run, None if the consumer was never blocked
+
+
+class TrafficGenerator:
+    # Sends LoopBackGivenBytes at the offsets of a schedule. Send times are taken from the start of the run on a
+    # monotonic clock, so latency of the requests does not shift the following ones. The first failed request marks the
+    # time the consumer was blocked. If is_blocked is given, it is asked after failed requests only, so a run without
+    # failures sends nothing but the schedule.
+
+    def __init__(self, init, payload: str = LOOPBACK_20_BYTES, is_blocked=None):
+        self.init = init
+        self.payload = payload
+        self.payload_size = len(payload.split())
+        self.is_blocked = is_blocked
+
+    def bytes_to_requests(self, byte_rate: float) -> float:
+        return byte_rate / self.payload_size
+
+    def run(self, schedule) -> TrafficReport:
+        latencies = []
+        failed_requests = 0
+        first_blocked = None
+        start = monotonic()
+        for offset in schedule:
+            delay = start + offset - monotonic()
+            if delay > 0:
+                sleep(delay)
+            sent = monotonic()
+            try:
+                send_command(self.init, 'LoopBackGivenBytes', self.payload)
+            except Exception:
+                failed_requests += 1
+                if first_blocked is None and (self.is_blocked is None or self.is_blocked()):
+                    first_blocked = sent - start
+            latencies.append(monotonic() - sent)
+        duration = monotonic() - start
+        requests = len(latencies)
+        latencies.sort()
+        percentiles = {percentile: get_percentile(latencies, percentile) for percentile in TRAFFIC_LATENCY_PERCENTILES}
+        percentiles['max'] = latencies[-1] if latencies else 0.0
+        return TrafficReport(requests, failed_requests, duration, requests / duration if duration else 0.0,
+                             requests * self.payload_size / duration if duration else 0.0, percentiles, first_blocked)
+
+
+def find_capacity(init, supervisor, consumer, traffic: TrafficGenerator, high_rate: float,
+                  trial_time: float = CAPACITY_TRIAL_TIME, steps: int = CAPACITY_SEARCH_STEPS, lock=None) -> tuple:
+    # Binary search for the highest constant request rate that does not raise toMuchCommunication within the trial time.
+    # Every trial starts with reset errors and a regenerated accu. Returns the rate and (rate, report, blocked) trials.
+    low, high = 0.0, high_rate
+    trials = []
+    for _ in range(steps):
+        rate = (low + high) / 2
+        send_command(init, 'resetAllPendingErrors')
+        report = traffic.run(constant_schedule(rate, trial_time))
+        blocked = report.first_blocked is not None or is_too_much_communication(init)
+        trials.append((rate, report, blocked))
+        if blocked:
+            high = rate
+        else:
+            low = rate
+        wait_for_regeneration(supervisor, consumer, lock=lock)
+    send_command(init, 'resetAllPendingErrors')
+    return low, trials
 
 
 # **********************************
@@ -80,8 +289,52 @@ def configure_consumption_manager(init, set_operation_mode, get_operation_mode,
     if configuration['role'] is not None:
         activate_sitp(configuration['role'])
 
+    return supervisor
+
+
+# Communication is blocked above threshold_overload and unblocked again once the accu is below threshold_underload. The
+# helpers below predict from the assumed model (see REGENERATION_PERIOD), accu units are assumed to be 2 ** quantifier
+# bytes
+def get_bytes_per_accu_unit(supervisor) -> int:
+    return 2 ** supervisor.quantifier
+
+
+def max_sustainable_rate(supervisor) -> float:
+    # [bytes/s] traffic that regeneration removes from the accu again, so the accu does not grow
+    return supervisor.regeneration_value * get_bytes_per_accu_unit(supervisor) / REGENERATION_PERIOD
+
+
+def time_to_unblock(supervisor, current_accu: int) -> float:
+    # [s] until the accu is below threshold_underload without any further traffic
+    if current_accu < supervisor.threshold_underload:
+        return 0.0
+    if supervisor.regeneration_value == 0:
+        raise Exception('Consumer is never unblocked, regeneration value is 0')
+    periods = -(-(current_accu - supervisor.threshold_underload + 1) // supervisor.regeneration_value)
+    return periods * REGENERATION_PERIOD + REGENERATION_MARGIN
 
-def create_low_medium_error(init, activate_sitp, ultrasonic_simulation, role):
+
+def wait_for_regeneration(supervisor, consumer, lock=None) -> float:
+    # Wait the predicted time without polling, then poll the accu read from the meter until it is below
+    # threshold_underload. A wrong prediction only costs time, returns the time the regeneration took.
+    lock = lock if lock is not None else nullcontext()
+    with lock:
+        current_accu = consumer.accu
+    start = monotonic()
+    sleep(min(time_to_unblock(supervisor, current_accu), REGENERATION_TIMEOUT))
+    while True:
+        with lock:
+            regenerated_accu = consumer.accu
+        waited = monotonic() - start
+        if regenerated_accu < supervisor.threshold_underload:
+            return waited
+        if waited >= REGENERATION_TIMEOUT:
+            raise Exception(f'Accu is {regenerated_accu} after {waited:.0f} s of regeneration from {current_accu}, '
+                            f'expected below {supervisor.threshold_underload}')
+        sleep(REGENERATION_POLL_INTERVAL)
+
+
+def start_low_medium_error(init, activate_sitp, flow_profile):
     low_limit_medium_temp = '0E 01'  # 27.0'
     high_limit_medium_temp = '54 01'  # 34.0'
 
@@ -92,29 +345,99 @@ def create_low_medium_error(init, activate_sitp, ultrasonic_simulation, role):
     # set high limit to 34.0'
     send_command(init, 'Set_nldacm_data_errorHandling_threshold_highMediumTemperature', high_limit_medium_temp)
 
-    # start simulation (only for set medium temp = 10.0 and create low_medium_error which will be written in event log)
-    ultrasonic_simulation(simulation_mode=UltrasonicSimulationMode.NORMAL, phase_shift_diff=10240,
-                          medium_temperature=100, resonator_calibration=False, time_difference_1us=4000,
-                          sonic_speed_correction=19665)
+    # keep simulated medium temp at 10.0' so low_medium_error is raised again after every reset of pending errors
+    flow_profile.start([(10, 100, 60)])
 
-    # reset error
-    send_command(init, 'resetAllPendingErrors')
 
-    sleep(120)
+def get_event_log_entries(init) -> int:
+    return hex_string_to_int(send_command(init, 'ReadEventLogRingBuffer', '00',
+                                          return_parameters=['availableNumberOfDatasets'])['availableNumberOfDatasets'])
+
 
-    # stop simulation
-    disable_ultrasonic_simulation(init)
+def fill_event_log(init, entries: int, error_state: str = None) -> int:
+    # Reset pending errors (and report error_state if given) so a new error is logged, then poll the event log until
+    # the entry shows up instead of waiting a fixed time
+    available = get_event_log_entries(init)
+    target = min(available + entries, EVENT_LOG_MAX_ENTRIES)
+    while available < target:
+        send_command(init, 'resetAllPendingErrors')
+        if error_state is not None:
+            send_command(init, 'ReportErrorState', error_state)
+        previous = available
+        deadline = monotonic() + EVENT_LOG_ENTRY_TIMEOUT
+        while available == previous:
+            if monotonic() > deadline:
+                raise Exception(f'No event log entry has been generated within {EVENT_LOG_ENTRY_TIMEOUT} s')
+            sleep(EVENT_LOG_POLL_INTERVAL)
+            available = get_event_log_entries(init)
+    return available
 
-    activate_sitp(role)
 
+def is_too_much_communication(init) -> bool:
+    # Other pending errors (e.g. a low medium temperature left by another test) do not count
+    pending_errors = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
+    bits = bin(int(pending_errors.replace(' ', ''), 16))[2:]
+    return len(bits) > TOO_MUCH_COMMUNICATION_BIT and bits[TOO_MUCH_COMMUNICATION_BIT] == '1'
 
-def int_to_hex_string(integer: int, num_bytes: int) -> str:
-    return integer.to_bytes(num_bytes, 'little').hex().upper()
+
+def allure_attach_traffic(report: TrafficReport):
+    latencies = ''.join(f'<td>{report.latencies[percentile] * 1000:.1f}</td>' for percentile in report.latencies)
+    allure.attach(f"""
+                  <h2>Traffic</h2>
+                  <table style="width:100%">
+                    <tr>
+                      <th>Requests:</th>
+                      <th>Failed requests:</th>
+                      <th>Duration [s]:</th>
+                      <th>Rate [requests/s]:</th>
+                      <th>Rate [bytes/s]:</th>
+                      <th>First blocked [s]:</th>
+                      {''.join(f'<th>Latency p{percentile} [ms]:</th>' for percentile in report.latencies)}
+                    </tr>
+                    <tr align="center">
+                      <td>{report.requests}</td>
+                      <td>{report.failed_requests}</td>
+                      <td>{report.duration:.1f}</td>
+                      <td>{report.request_rate:.4f}</td>
+                      <td>{report.byte_rate:.4f}</td>
+                      <td>{report.first_blocked}</td>
+                      {latencies}
+                    </tr>
+                  </table>
+                  """,
+                  'Traffic',
+                  allure.attachment_type.HTML)
+
+
+def allure_attach_capacity(capacity: float, predicted: float, trials: list, payload_size: int):
+    rows = ''.join(f'''
+                    <tr align="center">
+                      <td>{rate:.4f}</td>
+                      <td>{rate * payload_size:.2f}</td>
+                      <td>{report.requests}</td>
+                      <td>{report.first_blocked}</td>
+                      <td>{blocked}</td>
+                    </tr>''' for rate, report, blocked in trials)
+    allure.attach(f"""
+                  <h2>Capacity</h2>
+                  <p>Highest sustained rate: {capacity:.4f} requests/s, {capacity * payload_size:.2f} bytes/s</p>
+                  <p>Rate predicted with the assumed regeneration model: {predicted:.2f} bytes/s</p>
+                  <table style="width:100%">
+                    <tr>
+                      <th>Rate [requests/s]:</th>
+                      <th>Rate [bytes/s]:</th>
+                      <th>Requests:</th>
+                      <th>First blocked [s]:</th>
+                      <th>Blocked:</th>
+                    </tr>{rows}
+                  </table>
+                  """,
+                  'Capacity',
+                  allure.attachment_type.HTML)
 
 
-def hex_string_to_int(lsb_hex_string):
-    int_value = int("".join(lsb_hex_string.split()[::-1]), 16)
-    return int_value
+def allure_attach_accu_samples(sampler):
+    allure.attach(sampler.to_csv(), 'Accu samples', allure.attachment_type.CSV)
 
 
 def allure_attach(configuration):
@@ -156,7 +479,7 @@ def allure_attach(configuration):
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK])
 @pytest.mark.parametrize('role', [None])
 def test_consumption_manager_trigger_error(init, mode, role, set_operation_mode, get_operation_mode, activate_sitp,
-                                           supervisor, switch):
+                                           supervisor, switch, link_lock, accu_sampler):
     # PRE-CONDITIONS
     # Configure consumption manager and set operation mode
     configuration = {
@@ -168,29 +491,33 @@ def test_consumption_manager_trigger_error(init, mode, role, set_operation_mode,
         'under_load': 1  # Below this threshold communication is unlocked
     }
 
-    configure_consumption_manager(init, set_operation_mode, get_operation_mode, activate_sitp, configuration,
-                                  supervisor)
+    configured_supervisor = configure_consumption_manager(init, set_operation_mode, get_operation_mode, activate_sitp,
+                                                          configuration, supervisor)
 
     # Read error state
     initial_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
 
+    # Record the accu values of the consumers while traffic drains and regeneration refills the budget
+    sampler = accu_sampler(configured_supervisor)
+    sampler.start()
+
     # TEST STEPS
     # Generate less then X traffic for the consumer ID. Assume that this command uses 20 bytes.
     for _ in range(3):
-        send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
+        send_command(init, 'LoopBackGivenBytes', LOOPBACK_20_BYTES)
 
     # Read error state for 60 bytes
     check_60_bytes = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
 
     # Try to communicate via consumer
-    send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
+    send_command(init, 'LoopBackGivenBytes', LOOPBACK_20_BYTES)
 
     # Check if communication is possible
     com_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
     check_80_bytes = bin(int("com_error_state", 16))[2:]
 
     # Generate more bytes to fill consumers accu to 100
-    send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
+    send_command(init, 'LoopBackGivenBytes', LOOPBACK_20_BYTES)
 
     # Read error sate for 100 bytes
     com_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
@@ -199,12 +526,14 @@ def test_consumption_manager_trigger_error(init, mode, role, set_operation_mode,
     check_100_bytes = bin(int("com_error_state", 16))[2:]
 
     # Wait as much time as it is needed for consumption manager to regenerate so that accu value is less then X
-    sleep(60)
+    wait_for_regeneration(configured_supervisor, configured_supervisor.consumer(switch), lock=link_lock)
 
     # Read error state after regeneration
     regen_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
 
     # POST-CONDITION
+    sampler.stop()
+    allure_attach_accu_samples(sampler)
     allure_attach(configuration)
 
     # TODO: Reset customer accus - command is required, above new config was used for the same step
@@ -255,15 +584,16 @@ def test_consumption_manager_lbus_communication(init, mode, role, set_operation_
 
     # TEST STEPS:
     # Try to communicate with int9 through L-Bus once every period for test_time (e.g. test_time=5min, period=30sec)
-    for _ in range(10):
-        send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
-        sleep(30)
+    traffic = TrafficGenerator(init)
+    traffic_report = traffic.run(constant_schedule(1 / INT9_REQUEST_PERIOD, INT9_TEST_TIME))
+    sleep(max(0.0, INT9_TEST_TIME - traffic_report.duration))
 
     error_state_after_test_time = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])[
         "pendingErrors"]
 
     # POST-CONDITIONS
     allure_attach(configuration)
+    allure_attach_traffic(traffic_report)
 
     # TODO: Reset customer accus - command is required
 
@@ -273,6 +603,60 @@ def test_consumption_manager_lbus_communication(init, mode, role, set_operation_
     # Check if any pending errors exists
     assert initial_error_state == NO_ERRORS
     assert error_state_after_test_time == NO_ERRORS
+    assert traffic_report.first_blocked is None
+
+
+@pytest.mark.test_id('c70e25e8-89a4-4f12-9e81-dcb0947fb28a')
+@pytest.mark.req_ids(['F362', 'F456'])
+@pytest.mark.creator('Grzegorz Szymanski')
+@pytest.mark.creation_date('19.10.2026')
+@allure.title('Consumer capacity')
+@allure.description('This test searches the highest constant LoopBackGivenBytes rate that a consumer sustains without '
+                    'toMuchCommunication for the given consumption manager configuration and reports it next to the '
+                    'rate predicted with the test-local regeneration model, which is not asserted on.')
+@pytest.mark.parametrize('supervisor, switch', [(supervisor, consumer)
+                                                for supervisor, consumers in SUPERVISOR_CONSUMERS.items()
+                                                for consumer in consumers])
+@pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK])
+@pytest.mark.parametrize('role', [None])
+def test_consumption_manager_capacity(init, mode, role, set_operation_mode, get_operation_mode, activate_sitp,
+                                      supervisor, switch, link_lock):
+    # PRE-CONDITIONS
+    # Configure consumption manager and set operation mode
+    configuration = {
+        'mode': mode,
+        'role': role,
+        'regeneration': 255,
+        'switch': switch,
+        'over_load': 100,  # Above this threshold communication is blocked
+        'under_load': 1  # Below this threshold communication is unlocked
+    }
+
+    configured_supervisor = configure_consumption_manager(init, set_operation_mode, get_operation_mode, activate_sitp,
+                                                          configuration, supervisor)
+    consumer = configured_supervisor.consumer(switch)
+
+    # Read error state
+    initial_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
+
+    # TEST STEPS
+    # Search the highest rate below a multiple of the rate predicted with the assumed model
+    traffic = TrafficGenerator(init, is_blocked=lambda: is_too_much_communication(init))
+    predicted_rate = max_sustainable_rate(configured_supervisor)
+    capacity, trials = find_capacity(init, configured_supervisor, consumer, traffic,
+                                     traffic.bytes_to_requests(predicted_rate) * CAPACITY_SEARCH_HEADROOM,
+                                     lock=link_lock)
+
+    # POST-CONDITIONS
+    allure_attach(configuration)
+    allure_attach_capacity(capacity, predicted_rate, trials, traffic.payload_size)
+
+    # Go to production mode
+    set_operation_mode(OperationMode(MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+
+    # Check if any pending errors exists
+    assert initial_error_state == NO_ERRORS
+    assert capacity > 0
 
 
 @pytest.mark.test_id('7e121594-8da4-4ea6-a1e1-1e074d3932bc')
@@ -287,7 +671,7 @@ def test_consumption_manager_lbus_communication(init, mode, role, set_operation_
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK])
 @pytest.mark.parametrize('role', [None])
 def test_consumption_manager_irda_log_readout(init, mode, role, set_operation_mode, get_operation_mode, activate_sitp,
-                                              supervisor, open_metrological_log):
+                                              supervisor, open_metrological_log, irda_session, flow_profile):
     # PRE-CONDITIONS
     # Configure consumption manager and set operation mode
     configuration = {
@@ -328,36 +712,23 @@ def test_consumption_manager_irda_log_readout(init, mode, role, set_operation_mo
     metrological_log_entries = hex_string_to_int(metrological_log_entries['availableNumberOfDatasets'])
 
     # Event log
-    event_log_max_entries = 255
-    # TODO: how can I generate entry faster then 2 min?
-    for _ in range(event_log_max_entries):
-        # generate log
-        create_low_medium_error(init, activate_sitp, ultrasonic_simulation, 'REP')
-    event_log_entries = send_command(init, 'ReadEventLogRingBuffer', '00',
-                                     return_parameters=['availableNumberOfDatasets'])['availableNumberOfDatasets']
-    event_log_entries = hex_string_to_int(event_log_entries)
+    event_log_max_entries = EVENT_LOG_MAX_ENTRIES
+    start_low_medium_error(init, activate_sitp, flow_profile)
+    event_log_entries = fill_event_log(init, event_log_max_entries)
+    flow_profile.stop()
 
     # READING ALL THE LOGS
+    # Keep the optical window open for the whole readout instead of waking the meter up for every burst
+    irda_session.open()
+
     # History log
-    history_log_read = []
-    for iteration in range(history_log_entries):
-        entry = send_command(init, 'readHistoryLog', int_to_hex_string(iteration, 2) + ' 01',
-                             return_parameters=['dataSet'])['dataSet']
-        history_log_read.append(entry)
+    history_log_read = RingBufferLogReader(init, 'readHistoryLog', history_log_entries).read()
 
     # Metrological log
-    metrological_log_read = []
-    for iteration in range(metrological_log_entries):
-        entry = send_command(init, 'ReadLogMetrological ', int_to_hex_string(iteration, 1),
-                             return_parameters=['timeOfChangeAsTypeFFormat'])['timeOfChangeAsTypeFFormat']
-        metrological_log_read.append(entry)
+    metrological_log_read = RingBufferLogReader(init, 'ReadLogMetrological', metrological_log_entries).read()
 
     # Event log
-    event_log_read = []
-    for iteration in range(event_log_entries):
-        entry = send_command(init, 'ReadEventLogRingBuffer', int_to_hex_string(iteration, 1),
-                             return_parameters=['dateTime'])['dateTime']
-        event_log_read.append(entry)
+    event_log_read = RingBufferLogReader(init, 'ReadEventLogRingBuffer', event_log_entries).read()
 
     # Exception recorder
     exceptions = send_command(init, 'ReadExceptionRecorder',
@@ -392,6 +763,7 @@ def test_consumption_manager_irda_log_readout(init, mode, role, set_operation_mo
                                                  'corruptRomCrcSegments',
                                                  'faultyExternalMemoryCommunication',
                                                  'lastFaultyExternalMemoryCommunicationSource'])
+    irda_session.close()
 
     # POST-CONDITIONS
     allure.attach(f"""
@@ -450,7 +822,7 @@ def test_consumption_manager_irda_log_readout(init, mode, role, set_operation_mo
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK])
 @pytest.mark.parametrize('role', [None])
 def test_consumption_manager_after_reset(init, mode, role, set_operation_mode, get_operation_mode, activate_sitp,
-                                         supervisor):
+                                         supervisor, reset_and_wait_ready):
     # PRE-CONDITIONS
     # Configure consumption manager and set operation mode
     configuration = {
@@ -471,7 +843,7 @@ def test_consumption_manager_after_reset(init, mode, role, set_operation_mode, g
     # TEST STEPS
     # Configure consumption manager over_load threshold to value X. Assume that this command uses 20 bytes.
     for _ in range(5):
-        send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
+        send_command(init, 'LoopBackGivenBytes', LOOPBACK_20_BYTES)
 
     # Read error state for 100 bytes
     second_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
@@ -480,16 +852,16 @@ def test_consumption_manager_after_reset(init, mode, role, set_operation_mode, g
     send_command(init, 'resetAllPendingErrors')
 
     # Try to communicate via consumer
-    send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
+    send_command(init, 'LoopBackGivenBytes', LOOPBACK_20_BYTES)
 
     # Read error state
     third_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
 
-    # Reset the meter
-    send_command(init, 'LowLevelPowerAndReset', parameters='06')
+    # Reset the meter and wait until it answers again
+    reset_and_wait_ready(init, '06')
 
     # Try to communicate via consumer
-    send_command(init, 'LoopBackGivenBytes', '00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00 00')
+    send_command(init, 'LoopBackGivenBytes', LOOPBACK_20_BYTES)
 
     # Check if communication is possible
     com_error_state = send_command(init, 'getErrorState', return_parameters=["pendingErrors"])["pendingErrors"]
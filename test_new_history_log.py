@@ -1,19 +1,8 @@
-import struct
-
 import allure
 import pytest
-from time import sleep, time
-from enum import Enum
-from random import randint
-
-from meter_interaction.com_interactions import send_command_return_response
-from support.commands_usage import call_command_to_delete_log, is_locked_storage_operation, lock_storage_mode
-from meter_interaction import com_interactions
-from support.hydrus2.commands import send_command, set_volume_accus, trigger_function, disable_ultrasonic_simulation
-from support.hydrus2.communication import close_irda_communication_window, CommunicationMode
-from support.hydrus2.errors import CiFieldError
-from support.meter_types import OperationMode, MeterOperation, MeterMode, TriggerFunction, UltrasonicSimulationMode
-from support.data_parser import reverse_stream, int_to_lsb
+
+from support.hydrus2.commands import send_command
+from support.meter_types import OperationMode, MeterOperation, MeterMode
 
 from itertools import chain
 
@@ -24,11 +13,6 @@ ERROR_CLASSES = ['00', '01', '02']
 DAILY_INTERVAL = '0x000B'
 HOURLY_INTERVAL = '0x000C'
 REMOVE_COMMANDS = ['deleteHistoryLog']
-ERROR_LIST = []
-LIST_OF_ENTRIES = []
-OUT_OF_HISTORY_LOG_DATA = []
-HISTORY_LOG_DATA = []
-LIST_OF_ALL_DATA_TYPES = []
 
 
 def preconditions(init, set_operation_mode, mode, selector):
@@ -50,12 +34,13 @@ def preconditions(init, set_operation_mode, mode, selector):
     send_command(init, 'configureHistoryLogDataset', selector, return_parameters=['returnedCommandBytes'])
 
 
-def postconditions(init, set_operation_mode):
+def postconditions(init, set_operation_mode, restore_state=True):
     # Clear history log
     send_command(init, 'deleteHistoryLog')
 
-    # Go to production mode
-    set_operation_mode(OperationMode(MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    # Go to production mode, unless the next test starts from the same state
+    if restore_state:
+        set_operation_mode(OperationMode(MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
 
 def check_roles(init, mode, activate_sitp, role):
@@ -75,7 +60,8 @@ def check_roles(init, mode, activate_sitp, role):
                         have the right resolution (1 digit after coma).''')
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP, LAB, TES, UTL'])
-def test_history_log_reading_data_and_resolution(init, set_operation_mode, mode, selector, activate_sitp, role):
+def test_history_log_reading_data_and_resolution(init, set_operation_mode, mode, selector, activate_sitp, role,
+                                                 restore_state, read_in_sequence):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -94,34 +80,27 @@ def test_history_log_reading_data_and_resolution(init, set_operation_mode, mode,
     send_command(init, 'EnableUltrasonicSimulation', '00')  # Uncompleted command.
 
     # Clear list to store data here
-    OUT_OF_HISTORY_LOG_DATA.clear()
+    out_of_history_log_data = []
 
-    # Read forward volume from accu
-    forward_volume_data = send_command(init, 'Get_ldacm_data_volumeDefinitionsAccu1',
-                                       return_parameters=['ldacm_data_volumeDefinitionsAccu1'])
-    forward_value = forward_volume_data['ldacm_data_volumeDefinitionsAccu1']
-    OUT_OF_HISTORY_LOG_DATA.append(forward_value)
+    # Read forward and backward volume from accus and current error state of every error class in one sequence
+    reference = read_in_sequence(init, [
+        ('Get_ldacm_data_volumeDefinitionsAccu1', None, ['ldacm_data_volumeDefinitionsAccu1']),
+        ('Get_ldacm_data_volumeDefinitionsAccu2', None, ['ldacm_data_volumeDefinitionsAccu2'])]
+        + [('getErrorState', error, ['pendingErrors']) for error in ERROR_CLASSES])
 
-    # Read backward volume from accu
-    backward_volume_data = send_command(init, 'Get_ldacm_data_volumeDefinitionsAccu2',
-                                        return_parameters=['ldacm_data_volumeDefinitionsAccu2'])
-    backward_value = backward_volume_data['ldacm_data_volumeDefinitionsAccu2']
-    OUT_OF_HISTORY_LOG_DATA.append(backward_value)
+    forward_value = reference['Get_ldacm_data_volumeDefinitionsAccu1', None]['ldacm_data_volumeDefinitionsAccu1']
+    out_of_history_log_data.append(forward_value)
+
+    backward_value = reference['Get_ldacm_data_volumeDefinitionsAccu2', None]['ldacm_data_volumeDefinitionsAccu2']
+    out_of_history_log_data.append(backward_value)
 
     # Read current medium temperature
     # TODO: Read current medium temperature
 
-    # Make sure that error list is empty
-    ERROR_LIST.clear()
-
-    # Read current error state
-    for error in ERROR_CLASSES:
-        response = send_command(init, 'getErrorState', error, return_parameters=['pendingErrors'])
-        value = response['pendingErrors']
-        ERROR_LIST.append(value)
+    error_list = [reference['getErrorState', error]['pendingErrors'] for error in ERROR_CLASSES]
 
     # Add errors to list with data
-    OUT_OF_HISTORY_LOG_DATA.append(ERROR_LIST)
+    out_of_history_log_data.append(error_list)
 
     # Read maximum forward flow rate
     # TODO: Read maximum forward flow rate
@@ -134,7 +113,7 @@ def test_history_log_reading_data_and_resolution(init, set_operation_mode, mode,
         send_command(init, 'triggerHistoryLogDatasetGeneration', parameters='')
 
     # Make sure that list of entries is empty
-    LIST_OF_ENTRIES.clear()
+    list_of_entries = []
 
     # Get 30 logs from "readHistoryLog" command
     for entry in range(AMOUNT_OF_HISTORY_LOG_ENTRIES):
@@ -143,13 +122,13 @@ def test_history_log_reading_data_and_resolution(init, set_operation_mode, mode,
                                         return_parameters=['dataSet'])
 
         data_set = history_log_data['dataSet']
-        LIST_OF_ENTRIES.append(data_set)
+        list_of_entries.append(data_set)
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
-    assert OUT_OF_HISTORY_LOG_DATA == LIST_OF_ENTRIES, "Data from history log and out of it are not equal."
-    assert ERROR_LIST != '', "Current error state is empty."
+    postconditions(init, set_operation_mode, restore_state)
+    assert out_of_history_log_data == list_of_entries, "Data from history log and out of it are not equal."
+    assert error_list != '', "Current error state is empty."
 
 
 @pytest.mark.test_id('ab8fc71c-a9c2-4f3f-a46b-ac6def670d66')
@@ -162,7 +141,8 @@ def test_history_log_reading_data_and_resolution(init, set_operation_mode, mode,
                         new entries should overwrite oldest entries.''')
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP, LAB, TES, UTL'])
-def test_history_log_max_number_of_entries(init, activate_sitp, role, mode, set_operation_mode, selector):
+def test_history_log_max_number_of_entries(init, activate_sitp, role, mode, set_operation_mode, selector,
+                                           restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -200,29 +180,29 @@ def test_history_log_max_number_of_entries(init, activate_sitp, role, mode, set_
     first_check_instance_status = instance_status['instanceStatus']
 
     # Make sure that list of entries is empty
-    LIST_OF_ENTRIES.clear()
+    list_of_entries = []
 
     # Read second to last entry
     available_entries = send_command(init, 'readHistoryLog', return_parameters=['dataSet'])
     response = available_entries['dataSet']
-    LIST_OF_ENTRIES.append(response)
-    second_to_last_entry = LIST_OF_ENTRIES[-2]
+    list_of_entries.append(response)
+    second_to_last_entry = list_of_entries[-2]
 
     # Add one additional entry to history log
     send_command(init, 'triggerHistoryLogDatasetGeneration')
 
     # Check number of logs in history log
-    assert len(LIST_OF_ENTRIES) == 1096, "Number of entries is not equal 1096"
+    assert len(list_of_entries) == 1096, "Number of entries is not equal 1096"
 
     # Read the flag "instanceStatus" - second instance status
     instance_status = send_command(init, 'getHistoryLogInfo', return_parameters=['instanceStatus'])
     second_check_instance_status = instance_status['instanceStatus']
 
-    last_entry = LIST_OF_ENTRIES[-1]
+    last_entry = list_of_entries[-1]
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
+    postconditions(init, set_operation_mode, restore_state)
     assert first_check_instance_status != second_check_instance_status, "Instances should be different."
     assert second_to_last_entry == last_entry, "This entries should be equal."
 
@@ -236,7 +216,8 @@ def test_history_log_max_number_of_entries(init, activate_sitp, role, mode, set_
                         from history log in correct modes and roles.''')
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP, LAB, TES, UTL'])
-def test_history_log_generating_and_deleting_entries(init, mode, role, set_operation_mode, activate_sitp, selector):
+def test_history_log_generating_and_deleting_entries(init, mode, role, set_operation_mode, activate_sitp, selector,
+                                                     restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -249,23 +230,23 @@ def test_history_log_generating_and_deleting_entries(init, mode, role, set_opera
     send_command(init, 'triggerHistoryLogDatasetGeneration')
 
     # Make sure that list of entries is empty
-    LIST_OF_ENTRIES.clear()
+    list_of_entries = []
 
     # Read history log content and clear history log if not empty
     response = send_command(init, 'readHistoryLog', parameters='00', return_parameters=['dataSet'])
     check_if_empty = response['dataset']
-    LIST_OF_ENTRIES.append(check_if_empty)
+    list_of_entries.append(check_if_empty)
     if check_if_empty == '0x0':
         assert "History log should not be empty"
     else:
         send_command(init, 'deleteHistoryLog')
-    LIST_OF_ENTRIES.clear()
+    list_of_entries = []
 
     # Read history log content
     response = send_command(init, 'readHistoryLog', parameters='00', return_parameters=['dataSet'])
     check_if_empty = response['dataset']
-    LIST_OF_ENTRIES.append(check_if_empty)
-    if LIST_OF_ENTRIES[0] == '0x0':
+    list_of_entries.append(check_if_empty)
+    if list_of_entries[0] == '0x0':
         pass
     else:
         assert "History log should be empty"
@@ -273,7 +254,8 @@ def test_history_log_generating_and_deleting_entries(init, mode, role, set_opera
     # POSTCONDITIONS
 
     send_command(init, 'deleteHistoryLog')
-    set_operation_mode(OperationMode(MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
+    if restore_state:
+        set_operation_mode(OperationMode(MeterMode.PRODUCTION, operation=MeterOperation.NORMAL))
 
 
 @pytest.mark.test_id('8cc22a94-311c-45d7-811d-fd4e335d9ff6')
@@ -285,7 +267,7 @@ def test_history_log_generating_and_deleting_entries(init, mode, role, set_opera
                         set to daily or hourly. Log should be generated automatically 
                         after logging interval time passes.''')
 @pytest.mark.parametrize('mode', [MeterMode.PRODUCTION])
-def test_history_log_logging_interval(init, mode, set_operation_mode, selector):
+def test_history_log_logging_interval(init, mode, set_operation_mode, selector, restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -303,18 +285,18 @@ def test_history_log_logging_interval(init, mode, set_operation_mode, selector):
         send_command(init, 'Set_rtcDateAndTime', parameters='0x0002')
 
         # Read history log content
-        LIST_OF_ENTRIES.clear()
+        list_of_entries = []
         response = send_command(init, 'readHistoryLog', parameters='00', return_parameters=['dataSet'])
         check_if_empty = response['dataset']
-        LIST_OF_ENTRIES.append(check_if_empty)
-        if LIST_OF_ENTRIES[0] == '0x0':
+        list_of_entries.append(check_if_empty)
+        if list_of_entries[0] == '0x0':
             assert "History log should not be empty"
         else:
             pass
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
+    postconditions(init, set_operation_mode, restore_state)
 
 
 @pytest.mark.test_id('2581b63d-aaac-4e8f-9c06-7adf78e8a649')
@@ -326,7 +308,7 @@ def test_history_log_logging_interval(init, mode, set_operation_mode, selector):
                         and operatingHours in history log on meters supplied
                         externally or by a battery.''')
 @pytest.mark.parametrize('mode', [MeterMode.PRODUCTION])
-def test_history_log_timestamps(init, set_operation_mode, mode, selector):
+def test_history_log_timestamps(init, set_operation_mode, mode, selector, restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -347,18 +329,18 @@ def test_history_log_timestamps(init, set_operation_mode, mode, selector):
     send_command(init, 'triggerHistoryLogDatasetGeneration')
 
     # Read first entry to check if dateTimeTypeF and operatingHOURS are there
-    LIST_OF_ENTRIES.clear()
+    list_of_entries = []
     response = send_command(init, 'readHistoryLog', parameters='00', return_parameters=['dataSet'])
     check_if_empty = response['dataset']
-    LIST_OF_ENTRIES.append(check_if_empty)
-    if '0x0002' and '0x0400' in LIST_OF_ENTRIES:
+    list_of_entries.append(check_if_empty)
+    if '0x0002' and '0x0400' in list_of_entries:
         pass
     else:
         assert '"dateTimeTypeF and operatingHours are required"'
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
+    postconditions(init, set_operation_mode, restore_state)
 
 
 @pytest.mark.test_id('b2c38a0b-7ae3-4e3e-808a-4eb8b1615794')
@@ -371,7 +353,8 @@ def test_history_log_timestamps(init, set_operation_mode, mode, selector):
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP, LAB, TES, UTL'])
 @pytest.mark.parametrize('selector', '[[fw], [bw], [er], [fw, bw], [bw, er], [bw, er], [all]]')     # Algorithm example
-def test_history_log_reading_selected_data(init, mode, role, set_operation_mode, activate_sitp, selector):
+def test_history_log_reading_selected_data(init, mode, role, set_operation_mode, activate_sitp, selector,
+                                           restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -385,12 +368,12 @@ def test_history_log_reading_selected_data(init, mode, role, set_operation_mode,
     # TEST STEPS
 
     # Get values of volume accus and error state
-    ERROR_LIST.clear()
+    error_list = []
     send_command(init, 'Get_ldacm_data_volumeDefinitionsAccu1', return_parameters=['ldacm_data_volumeDefinitionsAccu1'])
     for error in ERROR_CLASSES:
         response = send_command(init, 'getErrorState', error, return_parameters=['pendingErrors'])
         value = response['pendingErrors']
-        ERROR_LIST.append(value)
+        error_list.append(value)
 
     # 1024 (int) --> 400 (hex) --> '04 00' (hex string) --> '00 04' (LSB stirng)    # Conversion example
     '00 0A'
@@ -402,8 +385,8 @@ def test_history_log_reading_selected_data(init, mode, role, set_operation_mode,
     check_roles(init, mode, activate_sitp, role)
 
     # Read datasets
-    OUT_OF_HISTORY_LOG_DATA.clear()
-    ERROR_LIST.clear()
+    out_of_history_log_data = []
+    error_list = []
 
     forward_volume_data = send_command(init, 'Get_ldacm_data_volumeDefinitionsAccu1',
                                        return_parameters=['ldacm_data_volumeDefinitionsAccu1'])
@@ -416,26 +399,26 @@ def test_history_log_reading_selected_data(init, mode, role, set_operation_mode,
     for error in ERROR_CLASSES:
         response = send_command(init, 'getErrorState', error, return_parameters=['pendingErrors'])
         value = response['pendingErrors']
-        ERROR_LIST.append(value)
+        error_list.append(value)
 
-    OUT_OF_HISTORY_LOG_DATA.append(ERROR_LIST)
+    out_of_history_log_data.append(error_list)
 
     # TODO: Read maximum forward flowrate.
     # TODO: Read current flowrate.
-    # TODO : Add rest of data to LIST_OF_ALL_DATA_TYPES after commands available
+    # TODO : Add rest of data to list_of_all_data_types after commands available
 
-    LIST_OF_ALL_DATA_TYPES = list(chain(forward_value, backward_value, ERROR_LIST))
+    list_of_all_data_types = list(chain(forward_value, backward_value, error_list))
 
     # Check content of history log
-    HISTORY_LOG_DATA.clear()
+    history_log_data = []
     response = send_command(init, 'readHistoryLog', return_parameters=['dataSet'])
     contents = response['dataset']
-    HISTORY_LOG_DATA.append(contents)
+    history_log_data.append(contents)
 
     # TODO: Finish compare algorithm
     # Compare data
-    for data in LIST_OF_ALL_DATA_TYPES:
-        if data in HISTORY_LOG_DATA:
+    for data in list_of_all_data_types:
+        if data in history_log_data:
             pass
         else:
             assert "Values in history log and out of it are not equal"
@@ -445,7 +428,7 @@ def test_history_log_reading_selected_data(init, mode, role, set_operation_mode,
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
+    postconditions(init, set_operation_mode, restore_state)
 
 
 @pytest.mark.test_id('cd96d7b4-fbe4-49f0-b0a2-c14aa26d1211')
@@ -459,7 +442,8 @@ def test_history_log_reading_selected_data(init, mode, role, set_operation_mode,
                         'configureDigitHighlighting',''')
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
 @pytest.mark.parametrize('role', ['REP, LAB, TES, UTL'])
-def test_history_log_deleting_log_by_different_commands(init, mode, role, set_operation_mode, activate_sitp, selector):
+def test_history_log_deleting_log_by_different_commands(init, mode, role, set_operation_mode, activate_sitp, selector,
+                                                        restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -475,10 +459,11 @@ def test_history_log_deleting_log_by_different_commands(init, mode, role, set_op
     send_command(init, 'triggerHistoryLogDatasetGeneration')
 
     # Read history log content
+    list_of_entries = []
     response = send_command(init, 'readHistoryLog', parameters='00', return_parameters=['dataSet'])
     check_if_empty = response['dataset']
-    LIST_OF_ENTRIES.append(check_if_empty)
-    if LIST_OF_ENTRIES[0] == '0x0':
+    list_of_entries.append(check_if_empty)
+    if list_of_entries[0] == '0x0':
         assert "History log should not be empty"
     else:
         pass
@@ -487,7 +472,7 @@ def test_history_log_deleting_log_by_different_commands(init, mode, role, set_op
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
+    postconditions(init, set_operation_mode, restore_state)
 
 
 @pytest.mark.test_id('cd96d7b4-fbe4-49f0-b0a2-c14aa26d1211')
@@ -497,7 +482,7 @@ def test_history_log_deleting_log_by_different_commands(init, mode, role, set_op
 @allure.title('History log after reset')
 @allure.description('''This test checks if history log is kept intact after resetting the meter.''')
 @pytest.mark.parametrize('mode', [MeterMode.FIELD_FALLBACK, MeterMode.PRODUCTION])
-def test_history_log_after_reset(init, mode, set_operation_mode, selector):
+def test_history_log_after_reset(init, mode, set_operation_mode, selector, restore_state):
     # PRECONDITIONS
 
     preconditions(init, set_operation_mode, mode, selector)
@@ -530,7 +515,7 @@ def test_history_log_after_reset(init, mode, set_operation_mode, selector):
 
     # POSTCONDITIONS
 
-    postconditions(init, set_operation_mode)
+    postconditions(init, set_operation_mode, restore_state)
     assert history_log_content == after_reset_content, "Content in history log is not equal"
     assert history_log_nr_of_entries == after_reset_nr_of_entries, "Number of entries is not equal"
     assert history_log_nr_of_possible_entries == after_reset_nr_of_possible_entries,"Number of possible entries " \